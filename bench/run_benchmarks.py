@@ -0,0 +1,185 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Benchmarks for the level startup, the frame cost and the collision load.
+
+All benchmarks run headless, see src/headless.py. The results are written
+as json and compared against a stored baseline. If one of the measured
+values got slower than the baseline by more than the given tolerance, the
+script exits with an error.
+
+usage: run_benchmarks.py [--output FILE] [--baseline FILE] [--tolerance T]
+                         [--update-baseline]
+"""
+
+# Python imports
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+BENCHDIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHDIR, "..", "src"))
+
+import headless
+from panda3d.core import (
+    CollisionNode,
+    CollisionSphere,
+    CollisionHandlerQueue,
+    ModelPool,
+    TexturePool)
+
+# the number of extra colliders used for the traversal benchmark
+COLLIDERCOUNTS = [0, 8, 32, 128]
+# frames run before the frame cost gets measured
+WARMUPFRAMES = 60
+# differences below this value in ms are seen as noise
+NOISE_MS = 0.05
+
+def clearPools():
+    """Make sure every model and texture is loaded again"""
+    ModelPool.releaseAllModels()
+    TexturePool.releaseAllTextures()
+
+def timeIt(func):
+    startTime = time.time()
+    result = func()
+    return result, (time.time() - startTime) * 1000.0
+
+def benchStartup():
+    """Time the construction of the main parts of the world, each one
+    with empty model and texture pools"""
+    from level.level01 import Level01
+    from player import Player
+    from golem import Golem
+    results = {}
+
+    clearPools()
+    level, results["Level01"] = timeIt(Level01)
+    level.ignoreAll()
+    level.deathplaneColNP.removeNode()
+    clearPools()
+    player, results["Player"] = timeIt(Player)
+    player.cleanup()
+    clearPools()
+    golem, results["Golem"] = timeIt(Golem)
+    golem.cleanup()
+    base.cTrav.clearColliders()
+
+    clearPools()
+    world, results["World"] = timeIt(lambda: headless.loadWorld(0))
+    return world, results
+
+def benchFrames(numFrames):
+    """Run the default route through the dungeon and return the frame
+    time statistics without the warmup frames"""
+    script = [[frame + WARMUPFRAMES, event] for frame, event in headless.DEFAULTSCRIPT]
+    frameTimes = headless.runScript(script, numFrames + WARMUPFRAMES)
+    result = headless.summarize(frameTimes[WARMUPFRAMES:])
+    del result["frames"]
+    return result
+
+def benchTraversal(world, numTraversals):
+    """Time the traversal of the base traverser with more and more extra
+    colliders spread around the player"""
+    results = {}
+    rand = random.Random(0)
+    center = world.player.player.getPos(render)
+    for count in COLLIDERCOUNTS:
+        queue = CollisionHandlerQueue()
+        colliders = []
+        for i in range(count):
+            np = render.attachNewNode(CollisionNode("benchCollider%d" % i))
+            np.node().addSolid(CollisionSphere(0, 0, 0.5, 0.5))
+            np.setPos(
+                center.getX() + rand.uniform(-10, 10),
+                center.getY() + rand.uniform(-10, 10),
+                center.getZ())
+            base.cTrav.addCollider(np, queue)
+            colliders.append(np)
+        startTime = time.time()
+        for i in range(numTraversals):
+            base.cTrav.traverse(render)
+        results[str(count)] = (time.time() - startTime) * 1000.0 / numTraversals
+        for np in colliders:
+            base.cTrav.removeCollider(np)
+            np.removeNode()
+    return results
+
+def flatten(results, prefix=""):
+    """Get a flat dict with "group.name" keys for all measured values"""
+    values = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            values.update(flatten(value, prefix + key + "."))
+        else:
+            values[prefix + key] = value
+    return values
+
+def compare(results, baseline, tolerance):
+    """Returns a list with a message for every value that got slower than
+    the baseline"""
+    regressions = []
+    current = flatten(results)
+    for key, oldValue in sorted(flatten(baseline).items()):
+        if key not in current: continue
+        newValue = current[key]
+        if newValue - oldValue < NOISE_MS: continue
+        if newValue > oldValue * (1.0 + tolerance):
+            regressions.append("%s: %.3f ms, baseline %.3f ms (+%d%%)" % (
+                key, newValue, oldValue, 100 * (newValue - oldValue) / oldValue))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Ajaw benchmarks")
+    parser.add_argument("--output", default=os.path.join(BENCHDIR, "results.json"),
+                        help="file to write the results to")
+    parser.add_argument("--baseline", default=os.path.join(BENCHDIR, "baseline.json"),
+                        help="the stored results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed slowdown against the baseline, 0.2 is 20%%")
+    parser.add_argument("--frames", type=int, default=1200,
+                        help="number of measured frames for the frame benchmark")
+    parser.add_argument("--traversals", type=int, default=200,
+                        help="number of traversals per collider count")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="store the results as the new baseline")
+    args = parser.parse_args()
+
+    headless.setupEnvironment("offscreen")
+    headless.createBase()
+
+    world, startup = benchStartup()
+    results = {
+        "startup_ms": startup,
+        "frame_ms": benchFrames(args.frames),
+        "traverse_ms": benchTraversal(world, args.traversals)}
+
+    with open(args.output, "w") as outfile:
+        json.dump(results, outfile, indent=4, sort_keys=True)
+    json.dump(results, sys.stdout, indent=4, sort_keys=True)
+    sys.stdout.write("\n")
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as baselinefile:
+            json.dump(results, baselinefile, indent=4, sort_keys=True)
+        sys.stdout.write("baseline updated\n")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        sys.stdout.write("no baseline found, run with --update-baseline to create one\n")
+        return 0
+    with open(args.baseline) as baselinefile:
+        baseline = json.load(baselinefile)
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        sys.stderr.write("PERFORMANCE REGRESSION\n")
+        for regression in regressions:
+            sys.stderr.write("  %s\n" % regression)
+        return 1
+    sys.stdout.write("no regressions against the baseline\n")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
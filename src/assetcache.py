@@ -0,0 +1,185 @@
+"""Build-once bam cache for the egg models, animations and textures in the
+assets folder.
+
+Panda3D's BamCache is pointed to a folder in the users basedir. Every egg
+file that is loaded through the loader, including the animations loaded by
+the Actor class, will be converted to a bam file the first time it is
+loaded and then be served from the cache as long as the source files
+modification time and size didn't change.
+
+Textures are stored as txo files, already decoded, scaled down to the
+texture-max-size and with their mipmaps generated on the CPU, so the PNG
+files only have to be decoded once. With texture-cache-compressed the
+textures get compressed by the driver and are cached compressed, which
+saves video memory too. As the cached textures depend on these settings,
+each combination of them gets its own cache folder.
+"""
+import os
+import sys
+import json
+import logging
+from panda3d.core import (
+    BamCache,
+    Filename,
+    Loader,
+    LoaderOptions,
+    VirtualFileSystem,
+    TexturePool,
+    ConfigVariableBool,
+    ConfigVariableInt,
+    loadPrcFileData)
+
+# the image files the texture cache gets prebuilt from
+TEXTUREEXTENSIONS = [".png", ".jpg"]
+
+
+def setupModelCache(cachedir):
+    """Activate the global bam cache and store the cached files in the
+    given directory. This has to be called before the first model is
+    loaded to take effect for all assets."""
+    if not isEnabled():
+        logging.info("asset cache disabled")
+        return
+    maxSize = ConfigVariableInt("texture-max-size", 0).getValue()
+    compressed = ConfigVariableBool("texture-cache-compressed", False).getValue()
+    # generate the mipmaps on the CPU, so they will be stored in the cache
+    # instead of being generated by the driver on every start
+    textureConfig = ["driver-generate-mipmaps #f"]
+    if maxSize > 0:
+        textureConfig.append("max-texture-dimension %d" % maxSize)
+    if compressed:
+        textureConfig.append("compressed-textures #t")
+    loadPrcFileData("asset cache", "\n".join(textureConfig))
+
+    cachedir = os.path.join(cachedir, "assets-%s-%s" % (
+        maxSize if maxSize > 0 else "full",
+        "compressed" if compressed else "raw"))
+    if not os.path.exists(cachedir):
+        os.makedirs(cachedir)
+    cache = BamCache.getGlobalPtr()
+    cache.setRoot(Filename.fromOsSpecific(cachedir))
+    cache.setActive(True)
+    cache.setCacheModels(True)
+    cache.setCacheTextures(True)
+    cache.setCacheCompressedTextures(compressed)
+    logging.info("asset cache in %s" % cachedir)
+
+def isEnabled():
+    return ConfigVariableBool("asset-cache", True).getValue()
+
+def buildModelCache(assetdir):
+    """Load every egg file in the given asset directory once so all of them
+    will be available as bam files in the cache. Already cached and
+    unchanged files will not be converted again."""
+    loader = Loader.getGlobalPtr()
+    options = LoaderOptions()
+    converted = 0
+    for filename in sorted(os.listdir(assetdir)):
+        if not filename.endswith(".egg"): continue
+        path = Filename.fromOsSpecific(os.path.join(assetdir, filename))
+        if loader.loadSync(path, options) is None:
+            logging.error("couldn't load %s for the asset cache" % filename)
+            continue
+        converted += 1
+    return converted
+
+def buildTextureCache(assetdir):
+    """Load every image in the given asset directory once, so the textures
+    not referenced by any model are cached too"""
+    converted = 0
+    for filename in sorted(os.listdir(assetdir)):
+        if os.path.splitext(filename)[1].lower() not in TEXTUREEXTENSIONS: continue
+        path = Filename.fromOsSpecific(os.path.join(assetdir, filename))
+        if TexturePool.loadTexture(path) is None:
+            logging.error("couldn't load %s for the asset cache" % filename)
+            continue
+        converted += 1
+    return converted
+
+def getSourceKey(sources, version):
+    """Returns a string that identifies the current state of the given
+    source files. It will change whenever one of the files changes."""
+    vfs = VirtualFileSystem.getGlobalPtr()
+    key = ["version %s" % (version,)]
+    for source in sources:
+        vfile = vfs.getFile(Filename(source), True)
+        if vfile is None:
+            key.append("%s missing" % source)
+        else:
+            key.append("%s %d %d" % (
+                source, vfile.getTimestamp(), vfile.getFileSize()))
+    return "\n".join(key)
+
+def loadCachedModel(name, sources, build, version=1):
+    """Load a model that is generated from other assets. If the cache
+    holds a model with the given name that has been built from the
+    current state of the source files, it will be loaded from the cache.
+    Otherwise build will be called to generate the model, which then gets
+    written to the cache. Increase the version whenever the way the model
+    gets built changes. With the asset cache disabled the model will be
+    built every time."""
+    if not isEnabled():
+        return build()
+    key = getSourceKey(sources, version)
+    bamPath = os.path.join(cachedir, "%s.bam" % name)
+    keyPath = os.path.join(cachedir, "%s.key" % name)
+    if isCached(bamPath, keyPath, key):
+        model = loader.loadModel(
+            Filename.fromOsSpecific(bamPath),
+            noCache=True,
+            okMissing=True)
+        if model is not None:
+            return model
+    logging.info("build %s for the asset cache" % name)
+    model = build()
+    if not os.path.exists(cachedir):
+        os.makedirs(cachedir)
+    if model.writeBamFile(Filename.fromOsSpecific(bamPath)):
+        with open(keyPath, "w") as keyfile:
+            keyfile.write(key)
+    return model
+
+def loadCachedData(name, sources, build, version=1):
+    """Works like loadCachedModel for data that is generated from the
+    assets, build has to return something that can be stored as json.
+    If build returns None, nothing will be written to the cache."""
+    if not isEnabled():
+        return build()
+    key = getSourceKey(sources, version)
+    dataPath = os.path.join(cachedir, "%s.json" % name)
+    keyPath = os.path.join(cachedir, "%s.key" % name)
+    if isCached(dataPath, keyPath, key):
+        try:
+            with open(dataPath) as datafile:
+                return json.load(datafile)
+        except ValueError:
+            logging.error("couldn't read %s from the asset cache" % name)
+    logging.info("build %s for the asset cache" % name)
+    data = build()
+    if data is None:
+        return None
+    if not os.path.exists(cachedir):
+        os.makedirs(cachedir)
+    with open(dataPath, "w") as datafile:
+        json.dump(data, datafile)
+    with open(keyPath, "w") as keyfile:
+        keyfile.write(key)
+    return data
+
+def isCached(path, keyPath, key):
+    """Returns True if the file at path has been built with the given
+    key"""
+    if not os.path.exists(path) or not os.path.exists(keyPath):
+        return False
+    with open(keyPath) as keyfile:
+        return keyfile.read() == key
+
+if __name__ == "__main__":
+    # build the cache for the game upfront, e.g. as part of a release
+    home = os.path.expanduser("~")
+    rootdir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    setupModelCache(os.path.join(home, "Ajaw", "cache"))
+    num = buildModelCache(os.path.join(rootdir, "assets"))
+    sys.stdout.write("%d models cached\n" % num)
+    num = buildTextureCache(os.path.join(rootdir, "assets"))
+    sys.stdout.write("%d textures cached\n" % num)
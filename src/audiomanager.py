@@ -0,0 +1,44 @@
+"""Shared access to the music and sound effects of the game.
+
+Music tracks are streamed from disk instead of being decoded into memory
+and are only opened the first time they are needed. Short sound effects
+are decoded completely and kept in a least recently used cache. One
+instance is created at startup and stays alive for the whole session, so
+the sounds survive when the world gets rebuilt.
+"""
+import logging
+from collections import OrderedDict
+from panda3d.core import (
+    Filename,
+    ConfigVariableInt)
+
+class AudioManager():
+    def __init__(self):
+        self.music = {}
+        self.sfx = OrderedDict()
+        self.sfxCacheSize = ConfigVariableInt("audio-sfx-cache-size", 16).getValue()
+
+    def getMusic(self, name):
+        """Returns the streamed music track with the given filename"""
+        if name not in self.music:
+            manager = base.musicManager
+            self.music[name] = manager.getSound(
+                Filename(name), False, manager.SMStream)
+        return self.music[name]
+
+    def getSfx(self, name):
+        """Returns the decoded sound effect with the given filename. Sound
+        effects that haven't been used for long are dropped from the cache
+        if it holds more than audio-sfx-cache-size sounds."""
+        if name in self.sfx:
+            # mark as the most recently used one
+            sound = self.sfx.pop(name)
+        else:
+            manager = base.sfxManagerList[0]
+            sound = manager.getSound(Filename(name), False, manager.SMSample)
+        self.sfx[name] = sound
+        while len(self.sfx) > self.sfxCacheSize:
+            oldName, oldSound = self.sfx.popitem(last=False)
+            logging.debug("drop %s from the sound cache" % oldName)
+        return sound
+
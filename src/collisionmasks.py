@@ -0,0 +1,37 @@
+"""The collision layers of the game.
+
+Every collision node gets an into mask with the layer it belongs to and
+every collider gets a from mask with only the layers it has to test
+against, so the traverser doesn't test colliders against solids they
+don't care about.
+"""
+from panda3d.core import BitMask32
+
+# the walkable ground of the level, floor and plates
+FLOOR = BitMask32.bit(1)
+# walls, doors and all solid objects in the level
+WALLS = BitMask32.bit(2)
+# intangible spheres and boxes the player can activate or collect
+TRIGGERS = BitMask32.bit(3)
+# the view and hit fields of enemies
+ENEMIES = BitMask32.bit(4)
+# things that will hurt or kill the player, like the deathplane
+HAZARDS = BitMask32.bit(5)
+# the body of the player
+PLAYER = BitMask32.bit(6)
+
+NONE = BitMask32.allOff()
+
+def setIntoMask(np, mask):
+    """Set the into mask of the collision node at np and of all collision
+    nodes below it"""
+    if np.node().isCollisionNode():
+        np.node().setIntoCollideMask(mask)
+    for colNP in np.findAllMatches("**/+CollisionNode"):
+        colNP.node().setIntoCollideMask(mask)
+
+def setFromMask(np, mask):
+    """Set the from mask of the collider at np and make sure nothing else
+    will collide into it"""
+    np.node().setFromCollideMask(mask)
+    np.node().setIntoCollideMask(NONE)
@@ -0,0 +1,56 @@
+"""Hit checks for the attacks of the player and the enemies.
+
+An attack only has to know what it hits in the moment it lands, so there
+is no need to keep a collider for it in the traverser of the ShowBase,
+where it would be tested every frame. The hit query service runs such
+checks on demand with a traverser of its own. The collision nodes and
+handler queues used for the queries are pooled and reused, so a query
+doesn't allocate anything new once the pool has been filled.
+"""
+from panda3d.core import (
+    CollisionNode,
+    CollisionSegment,
+    CollisionTraverser,
+    CollisionHandlerQueue,
+    NodePath,
+    Point3)
+import collisionmasks
+
+class HitQueryService():
+    def __init__(self):
+        self.traverser = CollisionTraverser("hit queries")
+        # unused (collider nodepath, segment, queue) triples
+        self.pool = []
+
+    def querySegment(self, parent, pointA, pointB, mask, root=None):
+        """Returns the collision entries of a segment from pointA to
+        pointB, given relative to the parent node, with all collision
+        nodes below root that are in the given mask. The entries are
+        sorted by their distance to pointA."""
+        if root is None:
+            root = render
+        colliderNP, segment, queue = self.__acquire()
+        segment.setPointA(pointA)
+        segment.setPointB(pointB)
+        colliderNP.reparentTo(parent)
+        collisionmasks.setFromMask(colliderNP, mask)
+        self.traverser.addCollider(colliderNP, queue)
+        self.traverser.traverse(root)
+        queue.sortEntries()
+        entries = [queue.getEntry(i) for i in range(queue.getNumEntries())]
+        self.traverser.removeCollider(colliderNP)
+        self.__release(colliderNP, segment, queue)
+        return entries
+
+    def __acquire(self):
+        if self.pool:
+            return self.pool.pop()
+        segment = CollisionSegment(Point3(0, 0, 0), Point3(0, 0, 1))
+        colliderNP = NodePath(CollisionNode("hitQuery"))
+        colliderNP.node().addSolid(segment)
+        return colliderNP, segment, CollisionHandlerQueue()
+
+    def __release(self, colliderNP, segment, queue):
+        colliderNP.detachNode()
+        queue.clearEntries()
+        self.pool.append((colliderNP, segment, queue))
@@ -1,3 +1,4 @@
+import atexit
 from direct.showbase.DirectObject import DirectObject
 from pandac.PandaModules import loadPrcFileData
 
@@ -48,10 +49,18 @@ def setupDebugHelp(APP):
         APP.win.saveScreenshot(Filename.fromOsSpecific(path))
         logging.info(str.format("take Screenshot in: {0}", path))
 
+    # the per task frame time profiler, the recorded frames will be
+    # written to a csv file in the basedir when the game gets closed
+    from profiler import FrameProfiler
+    profiler = FrameProfiler()
+    profiler.start()
+    atexit.register(profiler.writeCSV)
+
     # create a DirectObject object to handle the key input by the user
     directobject = DirectObject()
     directobject.accept("f2", analyze)
     directobject.accept("f3", explorer)
     directobject.accept("f4", toggleWireframe)
     directobject.accept("f5", takeScreenshot)
+    directobject.accept("f6", profiler.toggleOverlay)
     directobject.accept("f12", toggleOobe)
@@ -0,0 +1,96 @@
+"""Reusable effect intervals.
+
+Each effect builds its intervals once for the node it belongs to and can
+be started again as often as needed, instead of creating a new tree of
+intervals every time it gets played. Effects that move a node work
+relative to the pose the node has when the effect starts, so one effect
+can be played at different places. The interval of an effect can also be
+put into a Sequence or Parallel that is built once as well.
+"""
+from panda3d.core import TransparencyAttrib
+from direct.interval.LerpInterval import LerpFunc
+from direct.interval.IntervalGlobal import (
+    Parallel,
+    Sequence)
+from direct.interval.FunctionInterval import (
+    Func,
+    Wait)
+
+class Effect():
+    def __init__(self, interval):
+        self.interval = interval
+
+    def start(self):
+        """Play the effect from the beginning, even if it is playing
+        already"""
+        self.interval.pause()
+        self.interval.start()
+
+    def stop(self):
+        """Stop the effect and bring the node back to its normal state"""
+        self.interval.pause()
+        self.restore()
+
+    def restore(self):
+        pass
+
+    def isPlaying(self):
+        return self.interval.isPlaying()
+
+class FlashEffect(Effect):
+    """Let the node blink in the given color"""
+    def __init__(self, np, color=(1, 0, 0, 0.75), flashes=4, flashTime=0.15):
+        self.np = np
+        steps = []
+        for i in range(flashes):
+            steps += [
+                Func(np.setColorScale, *color),
+                Wait(flashTime),
+                Func(np.clearColorScale),
+                Wait(flashTime)]
+        Effect.__init__(self, Sequence(*steps, name="FlashEffect-%s" % np.getName()))
+
+    def restore(self):
+        self.np.clearColorScale()
+
+class RiseAndSpinEffect(Effect):
+    """Lift the node up and turn it around its heading at the same time,
+    like an item that has been found"""
+    def __init__(self, np, height=1.0, riseTime=1.5, turns=2, spinTime=3.0):
+        self.np = np
+        self.startZ = 0.0
+        self.startH = 0.0
+        Effect.__init__(self, Sequence(
+            Func(self.__begin),
+            Parallel(
+                LerpFunc(self.__rise, toData=height, duration=riseTime),
+                LerpFunc(self.__spin, toData=360.0 * turns, duration=spinTime)),
+            name="RiseAndSpinEffect-%s" % np.getName()))
+
+    def __begin(self):
+        self.startZ = self.np.getZ()
+        self.startH = self.np.getH()
+
+    def __rise(self, offset):
+        self.np.setZ(self.startZ + offset)
+
+    def __spin(self, angle):
+        self.np.setH(self.startH + angle)
+
+class FadeEffect(Effect):
+    """Fade the node in or out by its alpha scale. The node is only
+    transparent while the effect plays and until it gets restored."""
+    def __init__(self, np, duration=0.25, fromAlpha=1.0, toAlpha=0.0):
+        self.np = np
+        Effect.__init__(self, Sequence(
+            Func(np.setTransparency, TransparencyAttrib.MAlpha),
+            LerpFunc(
+                np.setAlphaScale,
+                fromData=fromAlpha,
+                toData=toAlpha,
+                duration=duration),
+            name="FadeEffect-%s" % np.getName()))
+
+    def restore(self):
+        self.np.clearColorScale()
+        self.np.clearTransparency()
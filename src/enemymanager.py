@@ -0,0 +1,116 @@
+"""Spawns the enemies of a level and runs their AI.
+
+One golem is created for every Golem marker of the level. Instead of a
+task per golem, all active golems are updated in one simulation step,
+which reads the position of the player only once. Each golem only
+touches the scene graph when its heading or position actually changes.
+
+The AI has three levels of detail. Golems sleep until the player enters
+their view field. Awake golems further away than ai-near-distance think
+only every ai-far-step-interval simulation steps, all others think every
+step.
+
+If the level has a navigation grid, walking golems follow a path of
+waypoints to the player, which only gets planned again when the player
+moves to another cell of the grid.
+"""
+import math
+from direct.showbase.DirectObject import DirectObject
+from panda3d.core import (
+    Vec3,
+    ConfigVariableDouble,
+    ConfigVariableInt)
+from golem import Golem
+
+class EnemyManager(DirectObject):
+    def __init__(self, navMesh=None):
+        # the navigation grid of the level the golems plan their paths on
+        self.navMesh = navMesh
+        # list of (golem, start marker)
+        self.golems = []
+        self.player = None
+        self.nearDistance = ConfigVariableDouble("ai-near-distance", 12.0).getValue()
+        self.farStepInterval = ConfigVariableInt("ai-far-step-interval", 4).getValue()
+        # the simulated time that has passed since each golem thought the
+        # last time and the number of skipped steps
+        self.aiDelays = {}
+
+    def spawn(self, startPoints):
+        """Create a golem for each of the given start markers"""
+        for startPoint in startPoints:
+            self.golems.append((Golem(startPoint.getName(), self.navMesh), startPoint))
+
+    def start(self, player):
+        self.player = player
+        self.aiDelays = {}
+        for golem, startPoint in self.golems:
+            golem.start(startPoint)
+            self.aiDelays[golem] = [0.0, 0]
+        self.accept("playerCollision-in-golemViewField", self.__seePlayer)
+        self.accept("HitEnemy", self.__hitEnemy)
+        base.simClock.add("task_enemies", self.update)
+
+    def stop(self):
+        base.simClock.remove("task_enemies")
+        self.ignoreAll()
+        for golem, startPoint in self.golems:
+            golem.stop()
+        self.player = None
+
+    def reset(self):
+        for golem, startPoint in self.golems:
+            golem.reset()
+
+    def cleanup(self):
+        self.stop()
+        for golem, startPoint in self.golems:
+            golem.cleanup()
+        self.golems = []
+
+    def getActiveGolems(self):
+        return [golem for golem, startPoint in self.golems if golem.isActive()]
+
+    def __getGolem(self, np):
+        """Returns the golem the given node belongs to"""
+        for golem, startPoint in self.golems:
+            if golem.golem.isAncestorOf(np):
+                return golem
+        return None
+
+    def __seePlayer(self, entry):
+        golem = self.__getGolem(entry.getIntoNodePath())
+        if golem is None or golem.isActive() or golem.isDestroyed(): return
+        golem.activate(self.player)
+        base.messenger.send("golemSeesPlayer", [golem.golem])
+
+    def __hitEnemy(self, hitNP):
+        golem = self.__getGolem(hitNP)
+        if golem is not None and not golem.isDestroyed():
+            golem.hit()
+
+    def update(self, dt):
+        """One AI step for all active golems"""
+        active = self.getActiveGolems()
+        if not active: return
+        playerPos = self.player.getPos(render)
+        for golem in active:
+            delta = playerPos - golem.golem.getPos(render)
+            # the golem faces the player with its back, as it walks along -Y
+            heading = math.degrees(math.atan2(-delta.getX(), delta.getY())) + 180.0
+            direction = Vec3(delta.getX(), delta.getY(), 0)
+            direction.normalize()
+            self.__think(golem, dt, delta.length(), heading, direction)
+
+    def __think(self, golem, dt, distance, heading, direction):
+        """Run the AI step of the golem depending on its level of detail"""
+        delay = self.aiDelays[golem]
+        delay[0] += dt
+        delay[1] += 1
+        if distance < self.nearDistance:
+            golem.setAITier(Golem.NEAR)
+        else:
+            golem.setAITier(Golem.FAR)
+            if delay[1] < self.farStepInterval: return
+        golem.aiStep(delay[0], distance, heading, direction)
+        delay[0] = 0.0
+        delay[1] = 0
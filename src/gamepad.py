@@ -0,0 +1,56 @@
+"""Translate the pygame joystick events into panda events.
+
+Each button press and release is sent exactly once as the event the
+button is mapped to, with a -up suffix for the release, like the keyboard
+events panda sends. Axis motions are sent as gamepad-axis<number> events
+with the new axis value, but only for the axis that actually moved and
+only if the value changed after the deadzone has been applied.
+"""
+from direct.showbase.DirectObject import DirectObject
+from panda3d.core import ConfigVariableDouble
+try:
+    import pygame
+except:
+    pass
+
+# the events the buttons of the gamepad will send
+BUTTONMAP = {
+    0:"doAction",
+    5:"centerCam",
+    6:"zoomIn",
+    4:"zoomOut",
+    9:"escape"}
+
+class GamepadInput(DirectObject):
+    def __init__(self, joystick):
+        self.joystick = joystick
+        self.deadzone = ConfigVariableDouble("gamepad-deadzone", 0.15).getValue()
+        # the last value that has been sent for each axis
+        self.axisValues = {}
+
+    def start(self):
+        self.axisValues = {}
+        taskMgr.add(self.__update, "task_gamepad_loop", priority=-5)
+
+    def stop(self):
+        taskMgr.remove("task_gamepad_loop")
+
+    def __update(self, task):
+        for event in pygame.event.get():
+            if getattr(event, "joy", None) != self.joystick.get_id():
+                continue
+            if event.type == pygame.JOYBUTTONDOWN:
+                if event.button in BUTTONMAP:
+                    base.messenger.send(BUTTONMAP[event.button])
+            elif event.type == pygame.JOYBUTTONUP:
+                if event.button in BUTTONMAP:
+                    base.messenger.send(BUTTONMAP[event.button] + "-up")
+            elif event.type == pygame.JOYAXISMOTION:
+                value = event.value
+                if abs(value) < self.deadzone:
+                    value = 0.0
+                if self.axisValues.get(event.axis) == value:
+                    continue
+                self.axisValues[event.axis] = value
+                base.messenger.send("gamepad-axis%d" % event.axis, [value])
+        return task.cont
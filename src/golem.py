@@ -1,14 +1,17 @@
 import random
+import math
 from direct.actor.Actor import Actor
 from direct.fsm.FSM import FSM
 from direct.showbase.DirectObject import DirectObject
 from panda3d.core import (
     CollisionNode,
-    CollisionHandlerQueue,
     CollisionSphere,
     NodePath,
     PandaNode,
-    CollisionSegment)
+    Point3,
+    ConfigVariableDouble)
+import collisionmasks
+from effects import FlashEffect
 from direct.interval.IntervalGlobal import (
     Parallel,
     Sequence)
@@ -16,10 +19,25 @@ from direct.interval.FunctionInterval import (
     Wait,
     Func)
 
+# the start and end point of the segment that checks what an attack of the
+# golem hits, relative to the golem
+ATTACKSEGMENT = (Point3(0, 0, 1), Point3(0, -1.3, 1))
+
 class Golem(FSM, DirectObject):
-    def __init__(self):
+    # the AI levels of detail, a sleeping golem doesn't think at all, a far
+    # one thinks less often and a near one every simulation step
+    SLEEP = "Sleep"
+    FAR = "Far"
+    NEAR = "Near"
+
+    def __init__(self, name="Golem", navMesh=None):
         FSM.__init__(self, "FSM-Golem")
         random.seed()
+        # the name of the marker the golem has been spawned at
+        self.name = name
+        # without a navigation grid the golem walks straight to its enemy
+        self.navMesh = navMesh
+        self.__clearPath()
         self.golem = loader.loadModel("Golem")
         self.golem = Actor("Golem", {
             "Idle":"Golem-Idle",
@@ -27,21 +45,26 @@ class Golem(FSM, DirectObject):
             "Attack":"Golem-Attack",
             "Destroyed":"Golem-Destroyed"})
         self.golem.setBlend(frameBlend = True)
+        # let the actor animate less often the further away from the camera
+        # it is, if the panda version supports it. Otherwise far golems
+        # will not be animated at all.
+        self.hasAnimationLOD = hasattr(self.golem, "setLODAnimation")
+        if self.hasAnimationLOD:
+            nearDistance = ConfigVariableDouble("ai-near-distance", 12.0).getValue()
+            self.golem.setLODAnimation(nearDistance * 2, nearDistance / 2, 0.1)
+        self.aiTier = Golem.SLEEP
         golemViewSphere = CollisionSphere(0, 0, 0.5, 6)
         golemViewSphere.setTangible(False)
         golemViewColNP = self.golem.attachNewNode(CollisionNode('golemViewField'))
         golemViewColNP.node().addSolid(golemViewSphere)
+        golemViewColNP.node().setIntoCollideMask(collisionmasks.ENEMIES)
         golemHitSphere = CollisionSphere(0, 0, 0.5, 1)
         golemHitColNP = self.golem.attachNewNode(CollisionNode('golemHitField'))
         golemHitColNP.node().addSolid(golemHitSphere)
+        golemHitColNP.node().setIntoCollideMask(collisionmasks.ENEMIES)
 
-        # a collision segment to check attacks
-        self.attackCheckSegment = CollisionSegment(0, 0, 1, 0, -1.3, 1)
-        self.golemAttackRay = self.golem.attachNewNode(CollisionNode("golemAttackCollision"))
-        self.golemAttackRay.node().addSolid(self.attackCheckSegment)
-        self.golemAttackRay.node().setIntoCollideMask(0)
-        self.attackqueue = CollisionHandlerQueue()
-        base.cTrav.addCollider(self.golemAttackRay, self.attackqueue)
+        # blinks red whenever the golem gets hit
+        self.hitFlash = FlashEffect(self.golem)
 
         attackAnim = self.golem.actorInterval("Attack", playRate = 2)
         self.AttackSeq = Parallel(
@@ -64,43 +87,83 @@ class Golem(FSM, DirectObject):
         self.golem.setPos(startPos.getPos())
         self.golem.setHpr(startPos.getHpr())
         self.golem.reparentTo(render)
+        self.golem.show()
+        base.simClock.addInterpolated(self.golem)
         self.trackedEnemy = None
         self.health = 5
-        self.accept("playerCollision-in-golemViewField",
-                    lambda extraArgs: base.messenger.send("golemSeesPlayer", [self.golem]))
+        self.heading = self.golem.getH()
+        # sleep until the player enters the view field
+        self.aiTier = Golem.SLEEP
+        self.golem.pose("Idle", 0)
 
     def stop(self):
         self.trackedEnemy = None
-        taskMgr.remove("GolemAI_task")
+        base.simClock.removeInterpolated(self.golem)
         self.golem.hide()
         self.ignoreAll()
 
+    def reset(self):
+        """Bring the golem back to the initial state, the position will
+        be set again by start"""
+        self.AttackSeq.pause()
+        self.hitFlash.stop()
+        self.request("Off")
+        self.golem.stop()
+        self.golem.pose("Idle", 0)
+        self.trackerObject.setColor(0, 1, 0)
+        self.lookatFloater.hide()
+
     def cleanup(self):
         self.stop()
+        self.hitFlash.stop()
         self.lookatFloater.removeNode()
         self.golem.cleanup()
         self.golem.removeNode()
 
     def activate(self, trackedEnemy):
         self.trackedEnemy = trackedEnemy
-        taskMgr.add(self.aiTask, "GolemAI_task")
+        self.__clearPath()
+        self.lookatFloater.setPos(self.golem, 0, 0, 3.4)
         self.lookatFloater.show()
 
-    def aiTask(self, task):
-        dt = globalClock.getDt()
-        if self.AttackSeq.isPlaying(): return task.cont
+    def setAITier(self, tier):
+        """Switch the AI level of detail, the animation will be frozen for
+        far golems if the actor can't throttle it itself"""
+        if tier == self.aiTier: return
+        self.aiTier = tier
+        if self.hasAnimationLOD: return
+        if self.state == "Idle":
+            self.__loop("Idle")
+        elif self.state == "Walk":
+            self.__loop("Walk")
 
-        self.lookatFloater.setPos(self.golem, 0, 0, 3.4)
-        self.lookatFloater.lookAt(self.trackedEnemy)
-        self.lookatFloater.setH(self.lookatFloater.getH() + 180)
-        self.lookatFloater.setP(0)
-        self.lookatFloater.setR(0)
+    def __loop(self, animation):
+        if self.aiTier == Golem.FAR and not self.hasAnimationLOD:
+            self.golem.pose(animation, self.golem.getCurrentFrame(animation) or 0)
+        else:
+            self.golem.loop(animation, restart=0)
+
+    def isActive(self):
+        return self.trackedEnemy is not None and not self.isDestroyed()
+
+    def isDestroyed(self):
+        return self.state == "Destroyed"
+
+    def aiStep(self, dt, enemyDist, heading, direction):
+        """One step of the golem AI, called by the enemy manager with the
+        distance and heading to the tracked enemy and the direction
+        towards it"""
+        if self.AttackSeq.isPlaying(): return
 
-        self.golem.lookAt(self.trackedEnemy)
-        self.golem.setH(self.golem.getH() + 180)
+        if enemyDist >= 2.0:
+            # follow the path instead of walking straight into walls
+            heading, direction = self.__steer(heading, direction)
 
-        distanceVec = self.golem.getPos() - self.trackedEnemy.getPos()
-        enemyDist = distanceVec.length()
+        # only turn if the heading changed noticeable
+        if abs(heading - self.heading) > 0.5:
+            self.heading = heading
+            self.golem.setHpr(heading, 0, 0)
+            self.lookatFloater.setHpr(heading, 0, 0)
 
         if enemyDist < 2.0:
             # close enough for combat
@@ -111,69 +174,87 @@ class Golem(FSM, DirectObject):
                 if self.state != "Idle":
                     self.request("Idle")
         else:
-            self.golem.setY(self.golem, -0.5 * dt)
+            self.golem.setPos(self.golem.getPos() + direction * 0.5 * dt)
+            self.lookatFloater.setPos(self.golem, 0, 0, 3.4)
             if self.state != "Walk":
                 self.request("Walk")
 
-        return task.cont
+    def __clearPath(self):
+        # the cell of the enemy the path has been planned for, the
+        # waypoints and the index of the next one
+        self.targetCell = None
+        self.path = None
+        self.pathIndex = 0
+
+    def __steer(self, heading, direction):
+        """Returns the heading and direction towards the next waypoint of
+        the path to the tracked enemy. The path is only planned again if
+        the enemy moves to another cell. Without a path the given heading
+        and direction straight to the enemy will be returned."""
+        if self.navMesh is None: return heading, direction
+        enemyPos = self.trackedEnemy.getPos(render)
+        targetCell = self.navMesh.getCell(enemyPos)
+        if targetCell != self.targetCell:
+            self.targetCell = targetCell
+            self.path = self.navMesh.findPath(self.golem.getPos(render), enemyPos)
+            self.pathIndex = 0
+        if not self.path: return heading, direction
+
+        pos = self.golem.getPos(render)
+        while self.pathIndex < len(self.path):
+            delta = self.path[self.pathIndex] - pos
+            delta.setZ(0)
+            if delta.length() > self.navMesh.cellSize * 0.5: break
+            self.pathIndex += 1
+        # in the cell of the enemy, walk straight to it
+        if self.pathIndex >= len(self.path): return heading, direction
+        delta.normalize()
+        # the golem walks along -Y
+        heading = math.degrees(math.atan2(-delta.getX(), delta.getY())) + 180.0
+        return heading, delta
 
     def hit(self):
-        hitInterval = Sequence(
-            Func(self.golem.setColorScale, 1, 0, 0, 0.75),
-            Wait(0.15),
-            Func(self.golem.clearColorScale),
-            Wait(0.15),
-            Func(self.golem.setColorScale, 1, 0, 0, 0.75),
-            Wait(0.15),
-            Func(self.golem.clearColorScale),
-            Wait(0.15),
-            Func(self.golem.setColorScale, 1, 0, 0, 0.75),
-            Wait(0.15),
-            Func(self.golem.clearColorScale),
-            Wait(0.15),
-            Func(self.golem.setColorScale, 1, 0, 0, 0.75),
-            Wait(0.15),
-            Func(self.golem.clearColorScale),
-            Wait(0.15))
         self.health -= 1
         if self.health == 4:
             self.trackerObject.setColor(0, 1, 0)
-            hitInterval.start()
+            self.hitFlash.start()
         elif self.health == 3:
             self.trackerObject.setColor(0.25, 0.75, 0)
-            hitInterval.start()
+            self.hitFlash.start()
         elif self.health == 2:
             self.trackerObject.setColor(0.5, .5, 0)
-            hitInterval.start()
+            self.hitFlash.start()
         elif self.health == 1:
             self.trackerObject.setColor(0.75, 0.25, 0)
-            hitInterval.start()
+            self.hitFlash.start()
         elif self.health == 0:
             self.trackerObject.setColor(0, 0, 0)
             self.request("Destroyed")
 
     def ceckAttack(self):
-        for i in range(self.attackqueue.getNumEntries()):
-            entry = self.attackqueue.getEntry(i)
+        # check what the fist hits in front of the golem
+        for entry in base.hitQueries.querySegment(
+                self.golem,
+                ATTACKSEGMENT[0],
+                ATTACKSEGMENT[1],
+                collisionmasks.PLAYER):
             into = entry.getIntoNode()
             if "playerCollision" in into.getName():
                 if random.random() > .5:
                     base.messenger.send("HitPlayer")
 
     def enterIdle(self):
-        self.golem.loop("Idle")
+        self.__loop("Idle")
 
     def enterWalk(self):
         self.golem.setPlayRate(2, "Walk")
-        self.golem.loop("Walk")
+        self.__loop("Walk")
 
     def enterAttack(self):
         self.AttackSeq.start()
 
     def enterDestroyed(self):
-        self.ignoreAll()
-        taskMgr.remove("GolemAI_task")
         self.AttackSeq.finish()
         self.golem.play("Destroyed")
         self.lookatFloater.hide()
-        base.messenger.send("GolemDestroyed")
+        base.messenger.send("GolemDestroyed", [self])
@@ -72,6 +72,7 @@ class GameOverScreen():
 
     def show(self, winLoose, resulttime):
         if winLoose == "win":
+            self.lblWin["text"] = _("You Succeeded")
             timestring = "%d:%02d" % (resulttime/60, resulttime%60)
             self.lblResult["text"] = timestring
             self.lblTime.show()
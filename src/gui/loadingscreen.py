@@ -42,21 +42,16 @@ class LoadingScreen():
 
     def show(self):
         self.frameMain.show()
-        # and render two frames so the loading screen
-        # is realy shown on screen
-        base.graphicsEngine.renderFrame()
-        base.graphicsEngine.renderFrame()
 
     def hide(self):
         self.frameMain.hide()
 
     def setLoadingValue(self, value):
         """Set the waitbar value to the given value, where
-        value has to be a integer from 0 to 100"""
+        value has to be a integer from 0 to 100. The new value will be
+        shown with the next rendered frame."""
         if value > 100: value = 100
         if value < 0: value = 0
         self.wbLoading["value"] = value
         self.wbLoading["text"] = "{0}%".format(value)
-        base.graphicsEngine.renderFrame()
-        base.graphicsEngine.renderFrame()
 
@@ -0,0 +1,189 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Run the game world without a window and without the menus.
+
+The simulation uses a fixed frame time instead of the real time, so a run
+with the same seed and the same input script will always be the same.
+This is used to run a lot of playthroughs on machines without a GPU and
+measure the per frame costs of the game.
+
+usage: headless.py [--frames N] [--seed S] [--script FILE] [--fps FPS]
+                   [--profile CSVFILE]
+
+The world always renders into an offscreen buffer, as the player and the
+camera need a camera and a lens to work with.
+"""
+
+# Python imports
+import __builtin__
+import os
+import sys
+import json
+import time
+import random
+import gettext
+import argparse
+from panda3d.core import (
+    ClockObject,
+    CollisionTraverser,
+    CollisionHandlerPusher,
+    Filename,
+    VirtualFileSystem,
+    loadPrcFileData)
+
+# the default input script, a list of [frame, event] entries. The events
+# are the action events the input map sends to the player
+DEFAULTSCRIPT = [
+    [60, "input-forward"],
+    [240, "input-left"],
+    [270, "input-left-up"],
+    [420, "input-forward-up"],
+    [430, "input-action"],
+    [500, "input-forward"],
+    [560, "input-right"],
+    [600, "input-right-up"],
+    [720, "input-forward-up"],
+    [730, "input-action"]]
+
+def setupEnvironment(windowType="offscreen"):
+    """Set all the global variables and configurations the game modules
+    expect, like main.py does for the normal game. This has to be called
+    before the ShowBase gets created."""
+    __builtin__.appName = "Ajaw"
+    __builtin__.versionstring = "15.07"
+    home = os.path.expanduser("~")
+    __builtin__.basedir = os.path.join(home, __builtin__.appName)
+    if not os.path.exists(__builtin__.basedir):
+        os.makedirs(__builtin__.basedir)
+    __builtin__.rootdir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    vfs = VirtualFileSystem.getGlobalPtr()
+    vfs.mount(
+        Filename(os.path.join(__builtin__.rootdir,"assets")),
+        ".",
+        VirtualFileSystem.MFReadOnly
+    )
+    gettext.bindtextdomain(__builtin__.appName, "localedir")
+    gettext.textdomain(__builtin__.appName)
+    __builtin__._ = gettext.lgettext
+    # no input devices other than the script
+    __builtin__.gamepadSupport = False
+    loadPrcFileData("",
+    """
+        window-type %s
+        aux-display p3tinydisplay
+        audio-library-name null
+        sync-video #f
+        model-path %s
+        notify-level error
+        default-directnotify-level error
+    """%(windowType, Filename.fromOsSpecific(
+        os.path.join(__builtin__.rootdir, "assets")).getFullpath()))
+
+    import assetcache
+    __builtin__.cachedir = os.path.join(__builtin__.basedir, "cache")
+    assetcache.setupModelCache(__builtin__.cachedir)
+
+def createBase(frameRate=60):
+    """Create the ShowBase with a fixed step clock and the same base
+    settings the game sets up in main.py"""
+    from direct.showbase.ShowBase import ShowBase
+    from audiomanager import AudioManager
+    from inputmap import InputMap
+    from simclock import SimClock
+    from combat import HitQueryService
+    app = ShowBase()
+    base.audio = AudioManager()
+    base.inputMap = InputMap()
+    base.simClock = SimClock()
+    base.simClock.start()
+    base.hitQueries = HitQueryService()
+    # every frame will take exactly 1/frameRate seconds of game time
+    globalClock.setMode(ClockObject.MNonRealTime)
+    globalClock.setFrameRate(frameRate)
+    base.textWriteSpeed = 0.05
+    base.controlType = "Gamepad"
+    base.torchFxBackend = "particles"
+    base.mouseSensitivity = 1.0
+    base.cTrav = CollisionTraverser("base collision traverser")
+    base.pusher = CollisionHandlerPusher()
+    base.pusher.addInPattern('%fn-in-%in')
+    base.pusher.addOutPattern('%fn-out-%in')
+    return app
+
+def loadWorld(seed):
+    """Load and start the world, the task manager is stepped until all
+    loading stages are done"""
+    from world import World
+    world = World()
+    def start():
+        # the game modules seed the random generator while loading, so
+        # we have to set our seed right before the world starts
+        random.seed(seed)
+        world.start()
+    world.load(start)
+    while not world.loaded or world.pipeline.isRunning():
+        taskMgr.step()
+    return world
+
+def runScript(script, numFrames):
+    """Run the given number of frames and send the scripted input events.
+    Returns a list with the wall clock time each frame took in ms."""
+    events = {}
+    for entry in script:
+        events.setdefault(entry[0], []).append(entry[1:])
+    frameTimes = []
+    for frame in range(numFrames):
+        for event in events.get(frame, []):
+            base.messenger.send(event[0], event[1:])
+        startTime = time.time()
+        taskMgr.step()
+        frameTimes.append((time.time() - startTime) * 1000.0)
+    return frameTimes
+
+def summarize(frameTimes):
+    frameTimes = sorted(frameTimes)
+    return {
+        "frames": len(frameTimes),
+        "avg_ms": sum(frameTimes) / len(frameTimes),
+        "min_ms": frameTimes[0],
+        "median_ms": frameTimes[len(frameTimes) / 2],
+        "max_ms": frameTimes[-1]}
+
+def main():
+    parser = argparse.ArgumentParser(description="Run Ajaw without a window")
+    parser.add_argument("--frames", type=int, default=1200,
+                        help="number of frames to simulate")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed for the random generator")
+    parser.add_argument("--script",
+                        help="json file with a list of [frame, event, args...] entries")
+    parser.add_argument("--fps", type=int, default=60,
+                        help="the fixed frame rate of the simulation")
+    parser.add_argument("--profile",
+                        help="write the per task frame timings to this csv file")
+    args = parser.parse_args()
+
+    setupEnvironment("offscreen")
+    createBase(args.fps)
+    script = DEFAULTSCRIPT
+    if args.script:
+        with open(args.script) as scriptFile:
+            script = json.load(scriptFile)
+
+    loadWorld(args.seed)
+    profiler = None
+    if args.profile:
+        from profiler import FrameProfiler
+        profiler = FrameProfiler(numFrames=args.frames)
+        profiler.start()
+    result = summarize(runScript(script, args.frames))
+    result["seed"] = args.seed
+    if profiler is not None:
+        frameAvg, taskAvgs = profiler.getAverages()
+        result["tasks_avg_ms"] = dict(zip(profiler.taskNames, taskAvgs))
+        profiler.writeCSV(args.profile)
+    json.dump(result, sys.stdout, indent=4, sort_keys=True)
+    sys.stdout.write("\n")
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,10 @@
-from pandac.PandaModules import WindowProperties
+from pandac.PandaModules import WindowProperties, GraphicsWindow
 import sys
 
 def hide_cursor():
     """set the Cursor invisible"""
+    # offscreen buffers have no cursor
+    if not isinstance(base.win, GraphicsWindow): return
     props = WindowProperties()
     props.setCursorHidden(True)
     # somehow the window gets undecorated after hiding the cursor
@@ -12,6 +14,8 @@ def hide_cursor():
 
 def show_cursor():
     """set the Cursor visible again"""
+    # offscreen buffers have no cursor
+    if not isinstance(base.win, GraphicsWindow): return
     props = WindowProperties()
     props.setCursorHidden(False)
     # set the filename to the mouse cursor
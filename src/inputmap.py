@@ -0,0 +1,57 @@
+"""Map the keyboard, mouse and gamepad events to the actions of the game.
+
+The events of every action are read from the bind-<action> variables of
+the config, e.g. "bind-forward arrow_up w", and are bound once at startup.
+For each of them the input map sends input-<action> when it is pressed and
+input-<action>-up when it is released, so the game only has to listen for
+the actions and never for the device events.
+"""
+from direct.showbase.DirectObject import DirectObject
+from panda3d.core import ConfigVariableString
+
+# the actions and the events they are bound to by default. The gamepad
+# buttons send the doAction, centerCam, zoomIn and zoomOut events.
+ACTIONS = [
+    ("left", ["arrow_left", "a"]),
+    ("right", ["arrow_right", "d"]),
+    ("forward", ["arrow_up", "w"]),
+    ("backward", ["arrow_down", "s"]),
+    ("action", ["doAction", "enter", "e"]),
+    ("centerCam", ["centerCam", "home", "q"]),
+    ("zoomIn", ["zoomIn", "+", "wheel_up"]),
+    ("zoomOut", ["zoomOut", "-", "wheel_down"])]
+
+class InputMap(DirectObject):
+    def __init__(self):
+        self.bindings = {}
+        for action, events in ACTIONS:
+            value = ConfigVariableString(
+                "bind-%s" % action, " ".join(events)).getValue()
+            self.bindings[action] = value.split()
+        self.bind()
+
+    def getConfigVariableNames(self):
+        return ["bind-%s" % action for action, events in ACTIONS]
+
+    def getBindings(self):
+        """Returns a list of (variable name, value) pairs to store the
+        bindings in a config page"""
+        return [("bind-%s" % action, " ".join(self.bindings[action]))
+                for action, events in ACTIONS]
+
+    def bind(self):
+        """Bind all events to their actions, bindings set before will be
+        removed"""
+        self.ignoreAll()
+        for action, events in ACTIONS:
+            for event in self.bindings[action]:
+                self.accept(event, base.messenger.send, ["input-%s" % action])
+                self.accept(
+                    "%s-up" % event,
+                    base.messenger.send,
+                    ["input-%s-up" % action])
+
+    def setBinding(self, action, events):
+        """Bind the given list of events to the action"""
+        self.bindings[action] = events
+        self.bind()
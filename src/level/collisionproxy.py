@@ -0,0 +1,213 @@
+"""Generate simplified collision geometry for the level.
+
+The floor, the walls and the plates of the level model carry polyset
+collisions that are made from the same polygons as the visible geometry,
+so they grow with every detail added to the art. This module builds a
+low poly replacement from them. All axis aligned rectangles that lie in
+the same plane are merged into as few rectangles as possible, polygons
+facing downwards are dropped as nothing can hit them from below, and all
+other polygons are kept as they are.
+"""
+from panda3d.core import (
+    NodePath,
+    CollisionNode,
+    CollisionPolygon,
+    Point3,
+    Vec3)
+
+# the collision nodes of the level that will be replaced by proxies
+PROXYGROUPS = ["Floor", "Walls", "Plate*"]
+# increase this whenever the generated proxies change
+PROXYVERSION = 3
+# precision used to compare coordinates
+EPSILON = 0.001
+
+def findProxySources(level):
+    """Returns all collision nodes of the level that get replaced by the
+    proxy geometry"""
+    sources = []
+    for group in PROXYGROUPS:
+        for colNP in level.findAllMatches("**/%s" % group):
+            if colNP.node().isCollisionNode():
+                sources.append(colNP)
+    return sources
+
+def buildCollisionProxies(level):
+    """Build the proxy collision geometry for the given level model. The
+    returned node holds one collision node per replaced source node, named
+    like the source with a _proxy suffix."""
+    root = NodePath("collisionProxies")
+    for colNP in findProxySources(level):
+        mat = colNP.getMat(level)
+        polygons = []
+        for i in range(colNP.node().getNumSolids()):
+            solid = colNP.node().getSolid(i)
+            if not isinstance(solid, CollisionPolygon): continue
+            points = [mat.xformPoint(solid.getPoint(p))
+                      for p in range(solid.getNumPoints())]
+            polygons.append(points)
+        proxy = CollisionNode("%s_proxy" % colNP.getName())
+        for solid in simplify(polygons):
+            proxy.addSolid(solid)
+        root.attachNewNode(proxy)
+    return root
+
+def simplify(polygons):
+    """Returns a list of collision polygons covering the same area as the
+    given polygons, which are lists of points"""
+    solids = []
+    planes = {}
+    for points in polygons:
+        normal = getNormal(points)
+        if normal is None or normal.getZ() < -0.7:
+            # degenerated or facing downwards
+            continue
+        plane = getAxisPlane(points, normal)
+        if plane is None:
+            solids += makeFan(points)
+            continue
+        planes.setdefault(plane[0], []).append(plane[1])
+    for key, rects in planes.iteritems():
+        for rect in mergeRects(rects):
+            solids.append(makePolygon(key, rect))
+    return solids
+
+def getNormal(points):
+    """Returns the normal of the polygon with Newell's method, which uses
+    all points, so polygons starting with collinear points still get
+    their normal"""
+    normal = Vec3(0, 0, 0)
+    for i in range(len(points)):
+        a = points[i]
+        b = points[(i + 1) % len(points)]
+        normal += Vec3(
+            (a[1] - b[1]) * (a[2] + b[2]),
+            (a[2] - b[2]) * (a[0] + b[0]),
+            (a[0] - b[0]) * (a[1] + b[1]))
+    if normal.length() < EPSILON:
+        return None
+    normal.normalize()
+    return normal
+
+def getPlaneAxes(axis, sign):
+    """Returns the two in plane axes of a plane facing along the given
+    axis, ordered so the rectangles will face the same direction"""
+    u, v = (axis + 1) % 3, (axis + 2) % 3
+    if sign < 0:
+        return v, u
+    return u, v
+
+def getAxisPlane(points, normal):
+    """If the polygon is a rectangle lying in an axis aligned plane return
+    the plane key and the rectangle in plane coordinates, else None"""
+    axis = None
+    for i in range(3):
+        if abs(abs(normal[i]) - 1.0) < EPSILON:
+            axis = i
+    if axis is None:
+        return None
+    sign = 1 if normal[axis] > 0 else -1
+    u, v = getPlaneAxes(axis, sign)
+    us = [p[u] for p in points]
+    vs = [p[v] for p in points]
+    rect = (min(us), min(vs), max(us), max(vs))
+    # every point has to be a corner of the rectangle
+    for p in points:
+        if not (isClose(p[u], rect[0]) or isClose(p[u], rect[2])): return None
+        if not (isClose(p[v], rect[1]) or isClose(p[v], rect[3])): return None
+    key = (axis, sign, round(points[0][axis], 3))
+    return key, rect
+
+def isClose(a, b):
+    return abs(a - b) < EPSILON
+
+def uniqueSorted(values):
+    result = []
+    for value in sorted(values):
+        if not result or not isClose(result[-1], value):
+            result.append(value)
+    return result
+
+def mergeRects(rects):
+    """Merge the given rectangles (u0, v0, u1, v1) into a small number of
+    rectangles covering the same area. The area is split into a grid at
+    every rectangle border and the covered grid cells are then greedily
+    merged."""
+    us = uniqueSorted([r[0] for r in rects] + [r[2] for r in rects])
+    vs = uniqueSorted([r[1] for r in rects] + [r[3] for r in rects])
+    covered = []
+    for i in range(len(us) - 1):
+        cu = (us[i] + us[i+1]) / 2.0
+        column = []
+        for j in range(len(vs) - 1):
+            cv = (vs[j] + vs[j+1]) / 2.0
+            inside = False
+            for r in rects:
+                if r[0] < cu < r[2] and r[1] < cv < r[3]:
+                    inside = True
+                    break
+            column.append(inside)
+        covered.append(column)
+
+    merged = []
+    for i in range(len(us) - 1):
+        for j in range(len(vs) - 1):
+            if not covered[i][j]: continue
+            # grow along v as far as possible
+            jEnd = j
+            while jEnd + 1 < len(vs) - 1 and covered[i][jEnd + 1]:
+                jEnd += 1
+            # then grow along u while the whole span is covered
+            iEnd = i
+            while iEnd + 1 < len(us) - 1 and \
+                    all(covered[iEnd + 1][j:jEnd + 1]):
+                iEnd += 1
+            for ci in range(i, iEnd + 1):
+                for cj in range(j, jEnd + 1):
+                    covered[ci][cj] = False
+            merged.append((us[i], vs[j], us[iEnd + 1], vs[jEnd + 1]))
+    return merged
+
+def makeFan(points):
+    """Returns collision polygons for the given convex polygon, polygons
+    with more than four points are split up. Collinear points are removed
+    first and triangles that would still be degenerated are skipped."""
+    points = removeCollinear(points)
+    if len(points) < 3:
+        return []
+    if len(points) <= 4:
+        fan = [points]
+    else:
+        fan = [[points[0], points[i], points[i+1]]
+               for i in range(1, len(points) - 1)]
+    return [CollisionPolygon(*polygon) for polygon in fan
+            if CollisionPolygon.verifyPoints(*polygon)]
+
+def removeCollinear(points):
+    """Returns the points of the polygon without the points that lie on a
+    straight line between their neighbours or on top of one of them"""
+    points = list(points)
+    removed = True
+    while removed and len(points) >= 3:
+        removed = False
+        for i in range(len(points)):
+            prev = points[i - 1]
+            next = points[(i + 1) % len(points)]
+            if (points[i] - prev).cross(next - points[i]).length() < EPSILON:
+                del points[i]
+                removed = True
+                break
+    return points
+
+def makePolygon(key, rect):
+    axis, sign, offset = key
+    u, v = getPlaneAxes(axis, sign)
+    points = []
+    for pu, pv in [(rect[0], rect[1]), (rect[2], rect[1]),
+                   (rect[2], rect[3]), (rect[0], rect[3])]:
+        coords = [0.0, 0.0, 0.0]
+        coords[axis] = offset
+        coords[u] = pu
+        coords[v] = pv
+        points.append(Point3(*coords))
+    return CollisionPolygon(*points)
@@ -4,9 +4,7 @@ import random
 from panda3d.core import (
     AmbientLight,
     Spotlight,
-    PointLight,
     PerspectiveLens,
-    Filename,
     CollideMask,
     CollisionSphere,
     CollisionBox,
@@ -19,20 +17,24 @@ from panda3d.core import (
     Plane,
     Vec3,
     Point3)
-from direct.interval.IntervalGlobal import (
-    Parallel,
-    Sequence)
-from direct.interval.FunctionInterval import (
-    Func,
-    Wait)
+from direct.interval.IntervalGlobal import Sequence
+from direct.interval.FunctionInterval import Func
 from direct.interval.AnimControlInterval import AnimControlInterval
 from direct.showbase.DirectObject import DirectObject
-from direct.particles.ParticleEffect import ParticleEffect
+import collisionmasks
+from level import levelbuilder
+from level.triggergrid import TriggerGrid
+from level.lightmanager import LightManager
+from level import torchfx
+from level import navmesh
+from effects import (
+    RiseAndSpinEffect,
+    FadeEffect)
 
 class Level01(DirectObject):
     def __init__(self):
-        # Level model
-        self.level = loader.loadModel("Level")
+        # Level model, flattened and with the collision proxies
+        self.level = levelbuilder.loadLevel()
         self.key = loader.loadModel("Key")
         self.artifact = loader.loadModel("Artifact")
 
@@ -75,11 +77,18 @@ class Level01(DirectObject):
         self.activePostsign = None
         self.activeBox = None
         self.activeDoor = None
+        self.chestFullAnimation = None
 
         self.numKeys = 0
 
+        self.initCollisionMasks()
+        # the proxies have to be sampled before they get split up into the
+        # trigger grid
+        self.navMesh = navmesh.loadNavMesh(self.level)
+
         # Set up all the little details
-        if base.particleMgrEnabled:
+        self.torchEffects = None
+        if torchfx.isEnabled():
             self.initTorchParticles()
         self.initSwitches()
         self.initSwitchSigns()
@@ -88,38 +97,47 @@ class Level01(DirectObject):
         self.initKeyDoors()
         self.initChests()
         self.initHearts()
+        self.initTriggerGrid()
 
         plane = self.level.find("**/Deathplane")
         deathplane = CollisionPlane(Plane((0, 0, 1), (0,0,-1)))
         deathplane.setTangible(False)
         self.deathplaneColNP = render.attachNewNode(CollisionNode('deathplane'))
         self.deathplaneColNP.node().addSolid(deathplane)
+        self.deathplaneColNP.node().setIntoCollideMask(collisionmasks.HAZARDS)
         self.accept("playerCollision-in-deathplane", lambda args: base.messenger.send("player-die"))
 
+    def initCollisionMasks(self):
+        """Sort the collision solids of the level model into the collision
+        layers. The floor and the plates are walkable, everything else in
+        the level, like walls, doors, jars and pillars is solid. The visible
+        geometry will not be used for collisions at all."""
+        for geomNP in self.level.findAllMatches("**/+GeomNode"):
+            geomNP.node().setIntoCollideMask(collisionmasks.NONE)
+        for colNP in self.level.findAllMatches("**/+CollisionNode"):
+            name = colNP.getName().lower()
+            if name.startswith("floor") or name.startswith("plate"):
+                colNP.node().setIntoCollideMask(collisionmasks.FLOOR)
+            elif name.startswith("deathplane"):
+                colNP.node().setIntoCollideMask(collisionmasks.HAZARDS)
+            else:
+                colNP.node().setIntoCollideMask(collisionmasks.WALLS)
+
     def initTorchParticles(self):
         torchTops = self.level.findAllMatches("**/TorchTop*")
-        fxList = ['TorchSmoke.ptf', 'TorchFire.ptf']
-        for torch in torchTops:
-            for fx in fxList:
-                p = ParticleEffect()
-                p.loadConfig(Filename(fx))
-                p.setPos(torch.getPos(render))
-                p.start(self.level)
+        self.torchEffects = torchfx.makeTorchEffects(self.level, torchTops)
 
     def initLights(self):
+        # only the torches nearest to the player will be lit
+        self.lightManager = LightManager(render)
         torches = self.level.findAllMatches("**/TorchTop*")
         self.lights = []
         for torch in torches:
-            tLight = PointLight(torch.getName())
-            tLight.setColor((.4, .2, .0, 1))
-            tlnp = render.attachNewNode(tLight)
-            tlnp.setPos(torch.getPos(render))
-            render.setLight(tlnp)
-            self.lights.append(tlnp)
+            self.lightManager.addPointLight(
+                torch.getName(), torch.getPos(render), (.4, .2, .0, 1))
 
         windows = self.level.findAllMatches("**/Window*")
         plates = self.level.findAllMatches("**/Plate*")
-        spikes = self.level.findAllMatches("**/Spikes*")
         for window in windows:
             wLight = Spotlight(window.getName())
             lens = PerspectiveLens()
@@ -134,7 +152,9 @@ class Level01(DirectObject):
 
         ambientLight = AmbientLight("ambientLight")
         ambientLight.setColor((.1, .1, .025, 1))
-        render.setLight(render.attachNewNode(ambientLight))
+        alnp = render.attachNewNode(ambientLight)
+        render.setLight(alnp)
+        self.lights.append(alnp)
 
     def initSwitches(self):
         # Find switch armatures
@@ -155,6 +175,7 @@ class Level01(DirectObject):
             switchsphere.setTangible(False)
             switchColNP = object.getParent().attachNewNode(CollisionNode('switchActivation%d'%i))
             switchColNP.node().addSolid(switchsphere)
+            switchColNP.node().setIntoCollideMask(collisionmasks.TRIGGERS)
             self.switchControls.setdefault(object.getParent(), [control, switchColNP])
             switchName = object.getParent().getParent().getName()
             self.accept("playerCollision-in-switchActivation%d"%i,
@@ -195,6 +216,7 @@ class Level01(DirectObject):
             postsphere.setTangible(False)
             postColNP = object.attachNewNode(CollisionNode('postsignInfo%d'%i))
             postColNP.node().addSolid(postsphere)
+            postColNP.node().setIntoCollideMask(collisionmasks.TRIGGERS)
             self.postsigns.setdefault(object, postColNP)
             postName = object.getName()
             self.accept("playerCollision-in-postsignInfo%d"%i,
@@ -212,6 +234,12 @@ class Level01(DirectObject):
         boxAnim = boxAnimNode.find("+AnimBundleNode").node().getBundle()
 
         self.boxControls = {}
+        # the item found in each chest and the effects that show it
+        self.itemEffects = {
+            "GET_Key":(self.key, RiseAndSpinEffect(self.key), FadeEffect(self.key)),
+            "GET_Artifact":(self.artifact, RiseAndSpinEffect(self.artifact), FadeEffect(self.artifact))}
+        # the animation of each chest, from opening it to collecting the item
+        self.chestAnimations = {}
 
         i = 0
         for object in objects:
@@ -222,9 +250,24 @@ class Level01(DirectObject):
             boxsphere.setTangible(False)
             boxColNP = object.getParent().attachNewNode(CollisionNode('boxActivation%d'%i))
             boxColNP.node().addSolid(boxsphere)
+            boxColNP.node().setIntoCollideMask(collisionmasks.TRIGGERS)
             #boxColNP.show()
             self.boxControls.setdefault(object.getParent(), [control, boxColNP])
             boxName = object.getParent().getParent().getName()
+            if boxName in self.chestLogic:
+                item, rise, fade = self.itemEffects[self.chestLogic[boxName]]
+                if self.chestLogic[boxName] == "GET_Key":
+                    collect = self.addKey
+                else:
+                    collect = self.getArtifact
+                self.chestAnimations[object.getParent()] = Sequence(
+                    AnimControlInterval(control),
+                    rise.interval,
+                    fade.interval,
+                    Func(item.hide),
+                    Func(fade.restore),
+                    Func(collect),
+                    name="chestAnimation%d" % i)
             self.accept("playerCollision-in-boxActivation%d"%i,
                         self.__setActivateElement,
                         extraArgs=[True, boxName, "box"])
@@ -262,8 +305,11 @@ class Level01(DirectObject):
 
         for key, value in self.doorControls.iteritems():
             value[0].pose(0)
+            # remember the collision mask to close the door again on reset
+            value.append(value[1].node().getIntoCollideMask())
 
     def initKeyDoors(self):
+        self.keyDoorColliders = []
         i = 0
         for keyDoor in self.KeyDoorLogic:
             for door, value in self.doorControls.iteritems():
@@ -275,6 +321,8 @@ class Level01(DirectObject):
                     keyDoorBox.setTangible(False)
                     keyDoorColNP = door.getParent().attachNewNode(CollisionNode('keyDoorActivation%d'%i))
                     keyDoorColNP.node().addSolid(keyDoorBox)
+                    keyDoorColNP.node().setIntoCollideMask(collisionmasks.TRIGGERS)
+                    self.keyDoorColliders.append(keyDoorColNP)
                     keyDoorName = door.getParent().getName()
                     self.accept("playerCollision-in-keyDoorActivation%d"%i,
                                 self.__setActivateElement,
@@ -287,6 +335,7 @@ class Level01(DirectObject):
     def initHearts(self):
         heartPositions = self.level.findAllMatches('**/*Heart*')
         self.hearts = []
+        self.heartColliders = []
         i = 0
         for pos in heartPositions:
             heart = loader.loadModel("Heart")
@@ -297,30 +346,54 @@ class Level01(DirectObject):
             heartsphere.setTangible(False)
             heartColNP = heart.attachNewNode(CollisionNode('heart%d'%i))
             heartColNP.node().addSolid(heartsphere)
+            heartColNP.node().setIntoCollideMask(collisionmasks.TRIGGERS)
             self.accept("playerCollision-in-heart%d"%i,
                         self.__collectHeart,
                         extraArgs=[i])
             self.hearts.append(heart)
+            self.heartColliders.append(heartColNP)
             i+=1
 
-    def start(self):
+    def initTriggerGrid(self):
+        """Sort all triggers and the collision proxies of the level into
+        a grid, so only the ones near the player will be traversed"""
+        self.triggerGrid = TriggerGrid(self.level)
+        for key, value in self.switchControls.iteritems():
+            self.triggerGrid.add(value[1])
+        for key, value in self.postsigns.iteritems():
+            self.triggerGrid.add(value)
+        for key, value in self.boxControls.iteritems():
+            self.triggerGrid.add(value[1])
+        for keyDoorColNP in self.keyDoorColliders:
+            self.triggerGrid.add(keyDoorColNP)
+        for heartColNP in self.heartColliders:
+            self.triggerGrid.add(heartColNP)
+        for proxy in self.level.findAllMatches("**/*_proxy"):
+            self.triggerGrid.addSplit(proxy)
+        self.triggerGrid.finalize()
+
+    def start(self, player):
         self.level.reparentTo(render)
+        self.triggerGrid.start(player)
         self.key.reparentTo(render)
         self.key.hide()
         self.artifact.reparentTo(render)
         self.artifact.hide()
         self.initLights()
+        self.lightManager.start(player)
+        if self.torchEffects is not None:
+            self.torchEffects.start(player)
 
         #
         # SETUP THE LOGIC PUZZLE IN ROOM 2
         #
         # get a random order
-        self.order1 = random.choice(self.switchOrders)
+        self.order1 = list(random.choice(self.switchOrders))
         # set the switch order
         switchlist = []
         for item in self.order1[1]:
             switchlist.append("Switch.00%d"%item)
-        self.switchOrderLogic.setdefault("ORDER1", switchlist)
+        self.switchOrderLogic["ORDER1"] = switchlist
         # randomly assign numbers between 0 and 10 to the switches
         signlist = []
         for i in range(4):
@@ -363,15 +436,52 @@ class Level01(DirectObject):
             "Signpost.005":_("Finally you made it all the way through path of the kings. Open the chest, take the artifact and you'll be ready for becomming the next king.")}
 
     def stop(self):
+        self.triggerGrid.stop()
+        self.lightManager.cleanup()
+        if self.torchEffects is not None:
+            self.torchEffects.stop()
         render.clearLight()
         self.level.clearLight()
-        self.level.removeNode()
+        for light in self.lights:
+            light.removeNode()
+        self.lights = []
+        self.level.detachNode()
+        self.key.detachNode()
+        self.artifact.detachNode()
+
+    def reset(self):
+        """Reset all switches, doors, chests and hearts to their initial
+        state, so the level can be started again without reloading it"""
+        if self.chestFullAnimation is not None:
+            self.chestFullAnimation.pause()
+            self.chestFullAnimation = None
+        for item, rise, fade in self.itemEffects.values():
+            rise.stop()
+            fade.stop()
+        self.activeSwitch = None
+        self.activePostsign = None
+        self.activeBox = None
+        self.activeDoor = None
+        self.numKeys = 0
+        for key, value in self.switchControls.iteritems():
+            value[0].pose(0)
+        for key, value in self.boxControls.iteritems():
+            value[0].pose(0)
+        for key, value in self.doorControls.iteritems():
+            value[0].pose(0)
+            value[1].node().setIntoCollideMask(value[2])
+        for sign in self.switchSigns:
+            sign.hide()
+        for heart in self.hearts:
+            heart.unstash()
+        for heartColNP in self.heartColliders:
+            heartColNP.unstash()
 
     def getPlayerStartPoint(self):
         return self.level.find("**/Character")
 
-    def getGolemStartPoint(self):
-        return self.level.find("**/Golem")
+    def getGolemStartPoints(self):
+        return self.level.findAllMatches("**/Golem*")
 
     def activateElement(self):
         if self.activeSwitch is not None: self.__activateSwitch()
@@ -455,44 +565,17 @@ class Level01(DirectObject):
         for box, value in self.boxControls.iteritems():
             if self.activeBox == box.getParent().getName():
                 if value[0].getFrame() != 0: return
-                if self.chestLogic[self.activeBox] == "GET_Key":
-                    self.key.show()
-                    self.key.setPos(box.getParent().getPos())
-                    self.key.setZ(self.key.getZ() + 0.5)
-                    self.key.setHpr(box.getParent().getHpr())
-                    self.key.setH(self.key.getH() + 90.0)
-                    keyRisingInterval = self.key.posInterval(1.5, Point3(self.key.getX(), self.key.getY(), self.key.getZ() + 1.0))
-                    keyRotationInterval = self.key.hprInterval(3.0, Vec3(self.key.getH() + 360*2, 0, 0))
-                    keyAnimation = Parallel(keyRisingInterval, keyRotationInterval, name="keyAnimation")
-                    boxAnimation = AnimControlInterval(value[0])
-                    chestFullAnimation = Sequence(
-                        boxAnimation,
-                        keyAnimation,
-                        Wait(0.25),
-                        Func(self.key.hide),
-                        Func(self.addKey))
-                elif self.chestLogic[self.activeBox] == "GET_Artifact":
-                    self.artifact.show()
-                    self.artifact.setPos(box.getParent().getPos())
-                    self.artifact.setZ(self.artifact.getZ() + 0.5)
-                    artifactRisingInterval = self.artifact.posInterval(
-                        1.5,
-                        Point3(self.artifact.getX(), self.artifact.getY(), self.artifact.getZ() + 1.0))
-                    artifactRotationInterval = self.artifact.hprInterval(
-                        3.0,
-                        Vec3(self.artifact.getH() + 360*2, 0, 0))
-                    artifactAnimation = Parallel(
-                        artifactRisingInterval,
-                        artifactRotationInterval,
-                        name="artifactAnimation")
-                    boxAnimation = AnimControlInterval(value[0])
-                    chestFullAnimation = Sequence(
-                        boxAnimation,
-                        artifactAnimation,
-                        Wait(0.25),
-                        Func(self.artifact.hide),
-                        Func(self.getArtifact))
-                chestFullAnimation.start()
+                if box not in self.chestAnimations: return
+                item, rise, fade = self.itemEffects[self.chestLogic[self.activeBox]]
+                fade.stop()
+                item.show()
+                item.setPos(box.getParent().getPos())
+                item.setZ(item.getZ() + 0.5)
+                if item == self.key:
+                    item.setHpr(box.getParent().getHpr())
+                    item.setH(item.getH() + 90.0)
+                self.chestFullAnimation = self.chestAnimations[box]
+                self.chestFullAnimation.start()
 
     def __activateKeyDoor(self):
         if self.numKeys > 0:
@@ -502,7 +585,9 @@ class Level01(DirectObject):
 
     def __collectHeart(self, index, extraArgs):
         heart = self.hearts[index]
-        heart.removeNode()
+        # stash the heart, so it can be respawned if the level gets reset
+        heart.stash()
+        self.heartColliders[index].stash()
         base.messenger.send("player-heal")
 
     def addKey(self):
@@ -0,0 +1,116 @@
+"""Build the optimized level model.
+
+The level model is made from a few hundred separate pieces, every wall
+piece, spike, jar, pillar and torch is its own node with its own geoms,
+which ends up as one draw call each. This module prepares the loaded level
+once: the polyset collisions get replaced by the collision proxies and all
+static geometry is moved below one node and flattened, so the geoms with
+the same render state get merged and the light of the torches gets baked
+into the vertex colors of it. The objects the game looks up by name,
+like switches, doors and chests, are kept as they are. The result is
+stored in the asset cache, so this only has to be done when one of the
+source models changes.
+"""
+import sys
+import fnmatch
+from level import collisionproxy
+from level import lightbaker
+import assetcache
+
+# the egg files the level model is built from
+SOURCES = [
+    "Level.egg",
+    "Boulder_Door.egg",
+    "Box_long_looseLid.egg",
+    "Jar_40cm.egg",
+    "Jar_40cm_small.egg",
+    "Jar_40cm_small_legs.egg",
+    "Pillar.egg",
+    "Signpost.egg",
+    "Spikes.egg",
+    "Stone_Door_entrance.egg",
+    "Switch.egg",
+    "Torch.egg",
+    "Window.egg",
+    "Wood_Door_Basic.egg"]
+# top level groups of the level that will not be flattened, as they are
+# animated, looked up by name or need their own lights
+KEEPGROUPS = [
+    "Switch.*",
+    "Signpost.*",
+    "*Door*",
+    "Box_long_looseLid*",
+    "Window*",
+    "Plate*",
+    "*Heart*",
+    "Character",
+    "Golem*",
+    "Deathplane",
+    "collisionProxies"]
+# empty nodes inside the static geometry that are looked up by name, a
+# copy of them is kept in the markers node
+MARKERS = ["TorchTop*"]
+# increase this whenever the way the level gets built changes
+BUILDVERSION = 3
+
+def loadLevel():
+    """Returns the optimized level model, either from the asset cache or
+    freshly built"""
+    return assetcache.loadCachedModel(
+        "Level-static",
+        SOURCES,
+        buildLevel,
+        (BUILDVERSION, collisionproxy.PROXYVERSION, lightbaker.isEnabled()))
+
+def buildLevel():
+    level = loader.loadModel("Level")
+    proxies = collisionproxy.buildCollisionProxies(level)
+    for colNP in collisionproxy.findProxySources(level):
+        colNP.removeNode()
+    proxies.reparentTo(level)
+    static = collectStatic(level)
+    # bake while every piece still has its own small vertex data, after
+    # flattening many geoms share one big vertex data
+    if lightbaker.isEnabled():
+        lightbaker.bakeLighting(static, level.find("markers").getChildren())
+    flattenStatic(static)
+    return level
+
+def isKept(name):
+    for pattern in KEEPGROUPS:
+        if fnmatch.fnmatchcase(name, pattern):
+            return True
+    return False
+
+def collectStatic(level):
+    """Move all static top level groups of the level below one node and
+    return it"""
+    markers = level.attachNewNode("markers")
+    for pattern in MARKERS:
+        for np in level.findAllMatches("**/%s" % pattern):
+            marker = markers.attachNewNode(np.getName())
+            marker.setMat(np.getMat(level))
+            np.removeNode()
+
+    static = level.attachNewNode("staticGeometry")
+    for child in level.getChildren():
+        if child == static or child == markers: continue
+        if isKept(child.getName()): continue
+        child.wrtReparentTo(static)
+    return static
+
+def flattenStatic(static):
+    """Merge the geoms of the static geometry into as few as possible"""
+    # the model roots of the instanced files would stop the flattening
+    static.clearModelNodes()
+    static.flattenStrong()
+    return static
+
+if __name__ == "__main__":
+    # build the level upfront without a window, run this from the src
+    # folder with: python -m level.levelbuilder
+    import headless
+    headless.setupEnvironment("none")
+    headless.createBase()
+    loadLevel()
+    sys.stdout.write("level built in %s\n" % cachedir)
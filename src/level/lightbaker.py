@@ -0,0 +1,116 @@
+"""Bake the torch lighting of the static level geometry into vertex colors.
+
+The torches of the level never move, so the light they cast onto the
+walls, floor and all the other static geometry is calculated once when
+the level gets built, the same way the fixed function pipeline would do
+it per vertex, and stored in the vertex colors. The baked geometry gets
+the dynamic lights switched off, so only the moving and animated objects
+like the player, the golem, the doors and the switches are still lit at
+runtime.
+"""
+from panda3d.core import (
+    GeomVertexData,
+    GeomVertexFormat,
+    GeomVertexReader,
+    GeomVertexWriter,
+    ColorAttrib,
+    MaterialAttrib,
+    Vec4,
+    ConfigVariableBool)
+
+# the same colors the dynamic lights of the level use
+TORCHCOLOR = Vec4(.4, .2, .0, 1)
+AMBIENTCOLOR = Vec4(.1, .1, .025, 1)
+# constant, linear and quadratic attenuation of the baked torch lights.
+# Without any falloff every torch would light the whole level, as nothing
+# casts shadows here.
+ATTENUATION = (1.0, 0.0, 0.05)
+
+def isEnabled():
+    return ConfigVariableBool("bake-lighting", True).getValue()
+
+def bakeLighting(root, torches):
+    """Bake the light of the torch nodes and the ambient light into the
+    vertex colors of all geoms below root and switch off the dynamic
+    lighting for root"""
+    lightPositions = [torch.getPos(root) for torch in torches]
+    for geomNP in root.findAllMatches("**/+GeomNode"):
+        mat = geomNP.getMat(root)
+        node = geomNP.node()
+        for i in range(node.getNumGeoms()):
+            state = node.getGeomState(i)
+            geom = node.modifyGeom(i)
+            geom.setVertexData(bakeVertexData(
+                geom.getVertexData(), state, mat, lightPositions))
+            # use the baked colors instead of a flat color of the state
+            node.setGeomState(i, state.setAttrib(ColorAttrib.makeVertex()))
+    root.setLightOff(1)
+
+def getBaseColors(state):
+    """Returns the ambient and diffuse color the fixed function pipeline
+    would use for geoms with the given state"""
+    ambient = Vec4(1, 1, 1, 1)
+    diffuse = Vec4(1, 1, 1, 1)
+    if state.hasAttrib(MaterialAttrib):
+        material = state.getAttrib(MaterialAttrib).getMaterial()
+        if material is not None:
+            if material.hasAmbient():
+                ambient = material.getAmbient()
+            if material.hasDiffuse():
+                diffuse = material.getDiffuse()
+    return ambient, diffuse
+
+def bakeVertexData(vdata, state, mat, lightPositions):
+    """Returns a copy of the vertex data with the lit colors"""
+    flatColor = None
+    if state.hasAttrib(ColorAttrib):
+        colorAttrib = state.getAttrib(ColorAttrib)
+        if colorAttrib.getColorType() == ColorAttrib.TFlat:
+            flatColor = colorAttrib.getColor()
+    hasColor = vdata.hasColumn("color")
+    hasNormal = vdata.hasColumn("normal")
+    # convertTo returns a const copy, which can't be written to
+    vdata = GeomVertexData(vdata.convertTo(GeomVertexFormat.registerFormat(
+        vdata.getFormat().getUnionFormat(GeomVertexFormat.getV3c4()))))
+    ambient, diffuse = getBaseColors(state)
+
+    vertexReader = GeomVertexReader(vdata, "vertex")
+    normalReader = GeomVertexReader(vdata, "normal") if hasNormal else None
+    colorReader = GeomVertexReader(vdata, "color") if hasColor else None
+    colorWriter = GeomVertexWriter(vdata, "color")
+    while not vertexReader.isAtEnd():
+        point = mat.xformPoint(vertexReader.getData3f())
+        if flatColor is not None:
+            color = Vec4(flatColor)
+        elif colorReader is not None:
+            color = Vec4(colorReader.getData4f())
+        else:
+            color = Vec4(1, 1, 1, 1)
+
+        light = Vec4(
+            AMBIENTCOLOR[0] * ambient[0],
+            AMBIENTCOLOR[1] * ambient[1],
+            AMBIENTCOLOR[2] * ambient[2],
+            0)
+        if normalReader is not None:
+            normal = mat.xformVec(normalReader.getData3f())
+            normal.normalize()
+            for lightPos in lightPositions:
+                direction = lightPos - point
+                distance = direction.length()
+                if distance < 0.0001: continue
+                direction /= distance
+                intensity = normal.dot(direction)
+                if intensity <= 0: continue
+                intensity /= (ATTENUATION[0]
+                              + ATTENUATION[1] * distance
+                              + ATTENUATION[2] * distance * distance)
+                for c in range(3):
+                    light[c] += TORCHCOLOR[c] * diffuse[c] * intensity
+
+        colorWriter.setData4f(
+            min(1.0, color[0] * light[0]),
+            min(1.0, color[1] * light[1]),
+            min(1.0, color[2] * light[2]),
+            color[3])
+    return vdata
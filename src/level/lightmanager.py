@@ -0,0 +1,68 @@
+"""Budget for the point lights of a level.
+
+The level has a torch on nearly every wall and each of them comes with a
+point light. As the fixed function pipeline shades every vertex with every
+light that is set on it, only the few lights nearest to the player will be
+enabled on the scene at any time. The set of active lights gets updated
+while the player moves through the level.
+"""
+from direct.showbase.DirectObject import DirectObject
+from panda3d.core import (
+    PointLight,
+    ConfigVariableInt)
+
+class LightManager(DirectObject):
+    def __init__(self, target):
+        # the node the lights will be enabled on
+        self.target = target
+        self.maxActiveLights = ConfigVariableInt("max-active-lights", 4).getValue()
+        self.lights = []
+        self.activeLights = set()
+        self.trackedNode = None
+
+    def addPointLight(self, name, pos, color):
+        """Create a point light at the given position. The light will not
+        shine until it is one of the nearest to the tracked node."""
+        light = PointLight(name)
+        light.setColor(color)
+        lnp = render.attachNewNode(light)
+        lnp.setPos(pos)
+        self.lights.append(lnp)
+        return lnp
+
+    def start(self, trackedNode):
+        """Start enabling the lights nearest to the tracked node"""
+        self.trackedNode = trackedNode
+        self.__updateLights()
+        taskMgr.doMethodLater(0.25, self.__update, "task_lightManager")
+
+    def stop(self):
+        taskMgr.remove("task_lightManager")
+        self.trackedNode = None
+        for lnp in self.activeLights:
+            self.target.clearLight(lnp)
+        self.activeLights = set()
+
+    def cleanup(self):
+        self.stop()
+        for lnp in self.lights:
+            lnp.removeNode()
+        self.lights = []
+
+    def __updateLights(self):
+        pos = self.trackedNode.getPos(render)
+        byDistance = sorted(
+            self.lights,
+            key=lambda lnp: (lnp.getPos(render) - pos).lengthSquared())
+        nearest = set(byDistance[:self.maxActiveLights])
+        # only touch the lights that changed, as every change of the light
+        # attrib has to be propagated through the scene graph
+        for lnp in self.activeLights - nearest:
+            self.target.clearLight(lnp)
+        for lnp in nearest - self.activeLights:
+            self.target.setLight(lnp)
+        self.activeLights = nearest
+
+    def __update(self, task):
+        self.__updateLights()
+        return task.again
@@ -0,0 +1,280 @@
+"""A navigation grid for the enemies of a level.
+
+The floor of the level is sampled in square cells on the XY plane. A cell
+is walkable if a ray cast down from above its center hits one of the floor
+or plate proxies and a sphere of the size of a golem, placed on that
+floor, doesn't touch the wall proxies. The sampling is done once and
+stored in the asset cache.
+
+Paths are searched with A* over the walkable cells and the results are
+kept in a small cache keyed by the start and goal cells, so golems that
+chase the player from the same place share one search.
+"""
+import math
+import heapq
+import logging
+from collections import OrderedDict
+from panda3d.core import (
+    CollisionNode,
+    CollisionPolygon,
+    CollisionRay,
+    CollisionSphere,
+    CollisionTraverser,
+    CollisionHandlerQueue,
+    ConfigVariableInt,
+    Point3)
+import collisionmasks
+import assetcache
+from level import collisionproxy
+from level import levelbuilder
+
+# the edge length of a cell
+CELLSIZE = 0.5
+# the radius and center height of the sphere that has to fit into a cell
+CLEARANCE = 0.6
+CLEARANCEHEIGHT = 1.0
+# the highest step between two neighbouring cells that can be walked
+MAXSTEP = 0.6
+# increase this whenever the way the grid gets built changes
+NAVVERSION = 2
+
+# the neighbours of a cell and the cost to walk there
+NEIGHBOURS = [
+    ((1, 0), 1.0),
+    ((-1, 0), 1.0),
+    ((0, 1), 1.0),
+    ((0, -1), 1.0),
+    ((1, 1), math.sqrt(2)),
+    ((1, -1), math.sqrt(2)),
+    ((-1, 1), math.sqrt(2)),
+    ((-1, -1), math.sqrt(2))]
+
+def loadNavMesh(level):
+    """Returns the navigation grid of the given level, either from the
+    asset cache or freshly built, or None if the level has no walkable
+    cells. The collision masks of the level have to be set up already."""
+    data = assetcache.loadCachedData(
+        "Level-navmesh",
+        levelbuilder.SOURCES,
+        lambda: buildNavData(level),
+        (levelbuilder.BUILDVERSION, collisionproxy.PROXYVERSION, NAVVERSION))
+    if data is None:
+        return None
+    return NavMesh(data)
+
+def buildNavData(level):
+    """Sample the collision proxies of the level and return the walkable
+    cells as json compatible dict, or None if there are none"""
+    proxies = level.find("**/collisionProxies")
+    if proxies.isEmpty():
+        logging.error("the level has no collision proxies to build the navmesh from")
+        return None
+    bounds = getSolidBounds(proxies)
+    if bounds is None:
+        logging.error("the collision proxies of the level are empty")
+        return None
+    lower, upper = bounds
+    data = {
+        "cellSize":CELLSIZE,
+        "originX":lower.getX(),
+        "originY":lower.getY(),
+        "cells":[]}
+    columns = int(math.ceil((upper.getX() - lower.getX()) / CELLSIZE))
+    rows = int(math.ceil((upper.getY() - lower.getY()) / CELLSIZE))
+
+    # find the height of the floor in every cell
+    rayNode = CollisionNode("navFloorRays")
+    for i in range(columns):
+        for j in range(rows):
+            rayNode.addSolid(CollisionRay(
+                lower.getX() + (i + 0.5) * CELLSIZE,
+                lower.getY() + (j + 0.5) * CELLSIZE,
+                upper.getZ() + 1.0,
+                0, 0, -1))
+    heights = {}
+    for entry in traverse(proxies, rayNode, collisionmasks.FLOOR):
+        point = entry.getSurfacePoint(proxies)
+        cell = (int((point.getX() - lower.getX()) // CELLSIZE),
+                int((point.getY() - lower.getY()) // CELLSIZE))
+        # on overlapping floors the highest one counts
+        heights[cell] = max(heights.get(cell, point.getZ()), point.getZ())
+
+    # drop the cells that are too close to a wall
+    sphereNode = CollisionNode("navClearanceSpheres")
+    for (i, j), z in heights.items():
+        sphereNode.addSolid(CollisionSphere(
+            lower.getX() + (i + 0.5) * CELLSIZE,
+            lower.getY() + (j + 0.5) * CELLSIZE,
+            z + CLEARANCEHEIGHT,
+            CLEARANCE))
+    for entry in traverse(proxies, sphereNode, collisionmasks.WALLS):
+        center = entry.getFrom().getCenter()
+        cell = (int((center.getX() - lower.getX()) // CELLSIZE),
+                int((center.getY() - lower.getY()) // CELLSIZE))
+        heights.pop(cell, None)
+
+    if not heights:
+        logging.error("no walkable cells found for the navmesh")
+        return None
+    for (i, j), z in sorted(heights.items()):
+        data["cells"].append([i, j, z])
+    return data
+
+def getSolidBounds(root):
+    """Returns the lower and upper corner of the box around all collision
+    polygons below root, relative to root, or None if there are none.
+    getTightBounds only looks at geoms, so it can't be used here."""
+    lower = None
+    upper = None
+    for colNP in root.findAllMatches("**/+CollisionNode"):
+        mat = colNP.getMat(root)
+        node = colNP.node()
+        for i in range(node.getNumSolids()):
+            solid = node.getSolid(i)
+            if not isinstance(solid, CollisionPolygon): continue
+            for p in range(solid.getNumPoints()):
+                point = mat.xformPoint(solid.getPoint(p))
+                if lower is None:
+                    lower = Point3(point)
+                    upper = Point3(point)
+                    continue
+                for axis in range(3):
+                    lower[axis] = min(lower[axis], point[axis])
+                    upper[axis] = max(upper[axis], point[axis])
+    if lower is None:
+        return None
+    return lower, upper
+
+def traverse(root, colliderNode, mask):
+    """Test all solids of the collider node against the nodes below root
+    and return the collision entries"""
+    colliderNP = root.attachNewNode(colliderNode)
+    collisionmasks.setFromMask(colliderNP, mask)
+    queue = CollisionHandlerQueue()
+    traverser = CollisionTraverser("navMeshBuilder")
+    traverser.addCollider(colliderNP, queue)
+    traverser.traverse(root)
+    entries = [queue.getEntry(i) for i in range(queue.getNumEntries())]
+    colliderNP.removeNode()
+    return entries
+
+class NavMesh():
+    def __init__(self, data):
+        self.cellSize = data["cellSize"]
+        self.originX = data["originX"]
+        self.originY = data["originY"]
+        # the floor height of every walkable cell
+        self.heights = {}
+        for i, j, z in data["cells"]:
+            self.heights[(i, j)] = z
+        self.maxPaths = ConfigVariableInt("nav-path-cache-size", 64).getValue()
+        # the found paths keyed by (start cell, goal cell), the least
+        # recently used path comes first
+        self.paths = OrderedDict()
+
+    def getCell(self, pos):
+        return (int((pos.getX() - self.originX) // self.cellSize),
+                int((pos.getY() - self.originY) // self.cellSize))
+
+    def getCellCenter(self, cell):
+        return Point3(
+            self.originX + (cell[0] + 0.5) * self.cellSize,
+            self.originY + (cell[1] + 0.5) * self.cellSize,
+            self.heights.get(cell, 0.0))
+
+    def isWalkable(self, cell):
+        return cell in self.heights
+
+    def findPath(self, startPos, goalPos):
+        """Returns a tuple with the centers of the cells to walk through
+        from startPos to goalPos, the cell of startPos is not included.
+        None will be returned if there is no way to the goal."""
+        start = self.__getNearestWalkable(self.getCell(startPos))
+        goal = self.__getNearestWalkable(self.getCell(goalPos))
+        if start is None or goal is None:
+            return None
+        key = (start, goal)
+        if key in self.paths:
+            path = self.paths.pop(key)
+        else:
+            cells = self.__search(start, goal)
+            if cells is None:
+                path = None
+            else:
+                path = tuple([self.getCellCenter(cell) for cell in cells])
+            if len(self.paths) >= self.maxPaths:
+                self.paths.popitem(last=False)
+        self.paths[key] = path
+        return path
+
+    def clearPaths(self):
+        self.paths.clear()
+
+    def __getNearestWalkable(self, cell, maxDistance=2):
+        """Returns the cell itself if it is walkable or the closest
+        walkable one around it. Bodies standing next to a wall are often
+        in a cell that has been dropped for its clearance."""
+        if cell in self.heights:
+            return cell
+        for distance in range(1, maxDistance + 1):
+            best = None
+            for i in range(-distance, distance + 1):
+                for j in range(-distance, distance + 1):
+                    if max(abs(i), abs(j)) != distance: continue
+                    neighbour = (cell[0] + i, cell[1] + j)
+                    if neighbour not in self.heights: continue
+                    length = i * i + j * j
+                    if best is None or length < best[0]:
+                        best = (length, neighbour)
+            if best is not None:
+                return best[1]
+        return None
+
+    def __getNeighbours(self, cell):
+        """Yields the walkable neighbours of the cell and the cost to walk
+        there. Corners of walls can't be cut diagonally."""
+        height = self.heights[cell]
+        for (i, j), cost in NEIGHBOURS:
+            neighbour = (cell[0] + i, cell[1] + j)
+            if neighbour not in self.heights: continue
+            if abs(self.heights[neighbour] - height) > MAXSTEP: continue
+            if i != 0 and j != 0:
+                if (cell[0] + i, cell[1]) not in self.heights: continue
+                if (cell[0], cell[1] + j) not in self.heights: continue
+            yield neighbour, cost
+
+    def __estimate(self, cell, goal):
+        """The octile distance between the two cells"""
+        dx = abs(cell[0] - goal[0])
+        dy = abs(cell[1] - goal[1])
+        return max(dx, dy) + (math.sqrt(2) - 1) * min(dx, dy)
+
+    def __search(self, start, goal):
+        """A* search from the start to the goal cell, returns the list of
+        cells of the path without the start cell or None"""
+        openCells = [(self.__estimate(start, goal), start)]
+        costs = {start:0.0}
+        cameFrom = {start:None}
+        closed = set()
+        while openCells:
+            estimate, cell = heapq.heappop(openCells)
+            if cell == goal:
+                break
+            if cell in closed: continue
+            closed.add(cell)
+            for neighbour, stepCost in self.__getNeighbours(cell):
+                cost = costs[cell] + stepCost
+                if neighbour in costs and costs[neighbour] <= cost: continue
+                costs[neighbour] = cost
+                cameFrom[neighbour] = cell
+                heapq.heappush(
+                    openCells,
+                    (cost + self.__estimate(neighbour, goal), neighbour))
+        else:
+            return None
+        path = []
+        while cell != start:
+            path.append(cell)
+            cell = cameFrom[cell]
+        path.reverse()
+        return path
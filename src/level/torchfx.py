@@ -0,0 +1,271 @@
+"""Fire and smoke of the torches.
+
+There are two backends, selected with the torch-fx-backend variable:
+
+particles: Instead of running two particle effects for every torch of the
+level, a small pool of effects is created and moved to the torches nearest
+to the player that are in view. Effects that are not needed are disabled,
+so the particle manager only updates the ones which can be seen. The .ptf
+configurations are read and compiled only once and then shared by all
+effects.
+
+shader: The flames and smoke of all torches are static billboard quads in
+one vertex buffer per texture. They are animated completely by a vertex
+shader driven by the frame time, so their cost doesn't depend on the
+number of torches. This backend doesn't use the particle system, so it is
+shown even if particles-enabled is switched off.
+"""
+import random
+from direct.showbase.DirectObject import DirectObject
+from direct.particles import ParticleEffect as ParticleEffectModule
+from direct.particles.ParticleEffect import ParticleEffect
+from panda3d.core import (
+    GeomNode,
+    Geom,
+    GeomTriangles,
+    GeomVertexData,
+    GeomVertexFormat,
+    GeomVertexArrayFormat,
+    GeomVertexWriter,
+    InternalName,
+    OmniBoundingVolume,
+    Shader,
+    TransparencyAttrib,
+    Filename,
+    VirtualFileSystem,
+    ConfigVariableInt,
+    ConfigVariableDouble)
+
+FXLIST = ['TorchSmoke.ptf', 'TorchFire.ptf']
+
+def isEnabled():
+    """Returns True if the configured backend can be used, the particles
+    backend needs the particle manager to be enabled"""
+    if base.torchFxBackend == "shader":
+        return True
+    return base.particleMgrEnabled
+
+def makeTorchEffects(parent, torches):
+    """Create the torch effects of the backend that is set up in the
+    config"""
+    if base.torchFxBackend == "shader":
+        return ShaderTorchEffects(parent, torches)
+    return TorchEffects(parent, torches)
+
+# compiled particle configurations by filename
+_configs = {}
+
+def getConfig(filename):
+    """Returns the compiled code of the given particle configuration"""
+    if filename not in _configs:
+        vfs = VirtualFileSystem.getGlobalPtr()
+        data = vfs.readFile(Filename(filename), True)
+        data = data.replace('\r', '')
+        _configs[filename] = compile(data, filename, "exec")
+    return _configs[filename]
+
+def makeEffect(filename):
+    """Create a particle effect from the given configuration, this does
+    the same as ParticleEffect.loadConfig without reading the file"""
+    effect = ParticleEffect()
+    # the configurations expect the names of the ParticleEffect module
+    exec getConfig(filename) in vars(ParticleEffectModule), {"self": effect}
+    return effect
+
+class TorchEffects(DirectObject):
+    def __init__(self, parent, torches):
+        self.parent = parent
+        self.torchPositions = [torch.getPos(parent) for torch in torches]
+        self.poolSize = ConfigVariableInt("torch-particle-pool-size", 6).getValue()
+        # torches further away from the player will have no particles
+        self.maxDistance = ConfigVariableDouble("torch-particle-distance", 15.0).getValue()
+        # each entry of the pool holds one effect per fx file
+        self.pool = []
+        for i in range(min(self.poolSize, len(self.torchPositions))):
+            self.pool.append([makeEffect(fx) for fx in FXLIST])
+        # the torch index each pool entry is assigned to or None
+        self.assignments = [None] * len(self.pool)
+        self.trackedNode = None
+
+    def start(self, trackedNode):
+        self.trackedNode = trackedNode
+        for effects in self.pool:
+            for effect in effects:
+                effect.start(self.parent)
+                effect.disable()
+        self.assignments = [None] * len(self.pool)
+        self.__updateEffects()
+        taskMgr.doMethodLater(0.25, self.__update, "task_torchEffects")
+
+    def stop(self):
+        taskMgr.remove("task_torchEffects")
+        self.trackedNode = None
+        for effects in self.pool:
+            for effect in effects:
+                effect.disable()
+        self.assignments = [None] * len(self.pool)
+
+    def cleanup(self):
+        self.stop()
+        for effects in self.pool:
+            for effect in effects:
+                effect.cleanup()
+        self.pool = []
+
+    def __isInView(self, pos):
+        if base.cam is None:
+            return True
+        return base.camNode.isInView(base.cam.getRelativePoint(self.parent, pos))
+
+    def __updateEffects(self):
+        playerPos = self.trackedNode.getPos(self.parent)
+        candidates = []
+        for i, pos in enumerate(self.torchPositions):
+            distance = (pos - playerPos).length()
+            if distance > self.maxDistance: continue
+            if not self.__isInView(pos): continue
+            candidates.append((distance, i))
+        wanted = set(i for distance, i in sorted(candidates)[:len(self.pool)])
+
+        # keep the effects running on torches which are still wanted
+        free = []
+        for slot, torch in enumerate(self.assignments):
+            if torch in wanted:
+                wanted.discard(torch)
+            else:
+                free.append(slot)
+        for slot in free:
+            effects = self.pool[slot]
+            if wanted:
+                torch = wanted.pop()
+                for effect in effects:
+                    effect.setPos(self.torchPositions[torch])
+                    if self.assignments[slot] is None:
+                        effect.enable()
+                self.assignments[slot] = torch
+            elif self.assignments[slot] is not None:
+                for effect in effects:
+                    effect.disable()
+                self.assignments[slot] = None
+
+    def __update(self, task):
+        self.__updateEffects()
+        return task.again
+
+
+SPRITE_VERT = """
+#version 120
+uniform mat4 p3d_ModelViewMatrix;
+uniform mat4 p3d_ProjectionMatrix;
+attribute vec4 p3d_Vertex;
+// corner u, corner v, phase and random seed of the sprite
+attribute vec4 sprite;
+uniform float time;
+uniform float lifetime;
+uniform float rise;
+uniform float spread;
+uniform float startSize;
+uniform float endSize;
+varying vec2 texcoord;
+varying float age;
+
+void main() {
+    age = fract(time / lifetime + sprite.z);
+    float angle = sprite.w * 6.2832;
+    vec4 pos = p3d_Vertex;
+    pos.xy += vec2(cos(angle), sin(angle)) * spread * age;
+    pos.z += rise * age;
+    // expand the quad in view space so it always faces the camera
+    vec4 viewPos = p3d_ModelViewMatrix * pos;
+    viewPos.xy += (sprite.xy - 0.5) * mix(startSize, endSize, age);
+    gl_Position = p3d_ProjectionMatrix * viewPos;
+    texcoord = sprite.xy;
+}
+"""
+
+SPRITE_FRAG = """
+#version 120
+uniform sampler2D p3d_Texture0;
+varying vec2 texcoord;
+varying float age;
+
+void main() {
+    vec4 color = texture2D(p3d_Texture0, texcoord);
+    color.a *= 1.0 - age;
+    gl_FragColor = color;
+}
+"""
+
+# the sprites per torch and their animation, modeled after the .ptf files
+SPRITESETTINGS = [
+    {"texture": "smoke.png", "sprites": 6, "lifetime": 0.7,
+     "rise": 0.15, "spread": 0.03, "startSize": 0.02, "endSize": 0.2},
+    {"texture": "fire.png", "sprites": 6, "lifetime": 0.15,
+     "rise": 0.03, "spread": 0.02, "startSize": 0.06, "endSize": 0.06}]
+
+class ShaderTorchEffects(DirectObject):
+    def __init__(self, parent, torches):
+        self.root = parent.attachNewNode("torchEffects")
+        self.root.hide()
+        torchPositions = [torch.getPos(parent) for torch in torches]
+        shader = Shader.make(Shader.SLGLSL, SPRITE_VERT, SPRITE_FRAG)
+        rand = random.Random(0)
+        for settings in SPRITESETTINGS:
+            np = self.root.attachNewNode(
+                self.__makeSprites(torchPositions, settings["sprites"], rand))
+            np.setTexture(loader.loadTexture(settings["texture"]))
+            np.setShader(shader)
+            for name in ["lifetime", "rise", "spread", "startSize", "endSize"]:
+                np.setShaderInput(name, settings[name])
+        self.root.setShaderInput("time", 0.0)
+        self.root.setTransparency(TransparencyAttrib.MAlpha)
+        self.root.setDepthWrite(False)
+        self.root.setLightOff(1)
+        self.root.setBin("fixed", 0)
+
+    def __makeSprites(self, positions, spritesPerTorch, rand):
+        """Returns a GeomNode with one quad per sprite. All four corners of
+        a quad lie in the torch position, the shader spreads them out."""
+        array = GeomVertexArrayFormat()
+        array.addColumn(InternalName.make("vertex"), 3, Geom.NTFloat32, Geom.CPoint)
+        array.addColumn(InternalName.make("sprite"), 4, Geom.NTFloat32, Geom.COther)
+        vformat = GeomVertexFormat.registerFormat(GeomVertexFormat(array))
+        vdata = GeomVertexData("torchSprites", vformat, Geom.UHStatic)
+        vertexWriter = GeomVertexWriter(vdata, "vertex")
+        spriteWriter = GeomVertexWriter(vdata, "sprite")
+        triangles = GeomTriangles(Geom.UHStatic)
+        index = 0
+        for pos in positions:
+            for i in range(spritesPerTorch):
+                phase = float(i) / spritesPerTorch
+                seed = rand.random()
+                for u, v in [(0, 0), (1, 0), (1, 1), (0, 1)]:
+                    vertexWriter.addData3f(pos)
+                    spriteWriter.addData4f(u, v, phase, seed)
+                triangles.addVertices(index, index + 1, index + 2)
+                triangles.addVertices(index, index + 2, index + 3)
+                index += 4
+        geom = Geom(vdata)
+        geom.addPrimitive(triangles)
+        node = GeomNode("torchSprites")
+        node.addGeom(geom)
+        # the vertices get moved by the shader, so the bounds are unknown
+        node.setBounds(OmniBoundingVolume())
+        node.setFinal(True)
+        return node
+
+    def start(self, trackedNode):
+        self.root.show()
+        taskMgr.add(self.__update, "task_torchEffects")
+
+    def stop(self):
+        taskMgr.remove("task_torchEffects")
+        self.root.hide()
+
+    def cleanup(self):
+        self.stop()
+        self.root.removeNode()
+
+    def __update(self, task):
+        self.root.setShaderInput("time", task.time)
+        return task.cont
@@ -0,0 +1,95 @@
+"""Spatial partitioning for the static collision nodes of a level.
+
+The trigger spheres and the collision proxies of the level are sorted into
+the cells of a regular grid on the XY plane. Each cell is a node of its
+own, so it gets tight bounds, and the cells far away from the player get
+stashed, which removes them from the collision traversal completely.
+"""
+from direct.showbase.DirectObject import DirectObject
+from panda3d.core import (
+    CollisionNode,
+    ConfigVariableDouble)
+
+class TriggerGrid(DirectObject):
+    def __init__(self, parent):
+        self.root = parent.attachNewNode("triggerGrid")
+        self.cellSize = ConfigVariableDouble("trigger-grid-cell-size", 8.0).getValue()
+        # cells which come closer to the player than this will be enabled
+        self.activeDistance = ConfigVariableDouble("trigger-grid-active-distance", 12.0).getValue()
+        self.cells = {}
+        # bounding spheres of the cells as (cellNP, center, radius)
+        self.cellBounds = []
+        self.trackedNode = None
+
+    def __getCell(self, point):
+        key = (int(point.getX() // self.cellSize), int(point.getY() // self.cellSize))
+        if key not in self.cells:
+            self.cells[key] = self.root.attachNewNode("triggerCell_%d_%d" % key)
+        return self.cells[key]
+
+    def add(self, colNP):
+        """Move the given node to the cell its center lies in, the node
+        keeps its position in the world. Nodes without any bounds stay
+        where they are."""
+        bounds = colNP.getBounds()
+        if bounds.isEmpty(): return
+        center = bounds.getApproxCenter()
+        center = self.root.getRelativePoint(colNP, center)
+        colNP.wrtReparentTo(self.__getCell(center))
+
+    def addSplit(self, colNP):
+        """Split the solids of the given collision node up into the cells
+        their centers lie in. One collision node with the same name and
+        masks will be created in each of those cells. Solids with empty
+        bounds can't be hit by anything and are dropped."""
+        node = colNP.node()
+        mat = colNP.getMat(self.root)
+        parts = {}
+        for i in range(node.getNumSolids()):
+            solid = node.getSolid(i)
+            bounds = solid.getBounds()
+            if bounds.isEmpty(): continue
+            center = mat.xformPoint(bounds.getApproxCenter())
+            cell = self.__getCell(center)
+            if cell not in parts:
+                part = CollisionNode(node.getName())
+                part.setIntoCollideMask(node.getIntoCollideMask())
+                part.setFromCollideMask(node.getFromCollideMask())
+                partNP = cell.attachNewNode(part)
+                partNP.setMat(mat)
+                parts[cell] = part
+            parts[cell].addSolid(solid)
+        colNP.removeNode()
+
+    def finalize(self):
+        """Has to be called after all nodes have been added, to calculate
+        the bounds of each cell"""
+        self.cellBounds = []
+        for cell in self.cells.values():
+            bounds = cell.getBounds()
+            if bounds.isEmpty(): continue
+            center = self.root.getRelativePoint(cell, bounds.getCenter())
+            self.cellBounds.append((cell, center, bounds.getRadius()))
+
+    def start(self, trackedNode):
+        """Start enabling and disabling the cells around the tracked node"""
+        self.trackedNode = trackedNode
+        for cell in self.cells.values():
+            cell.unstash()
+        taskMgr.doMethodLater(0.2, self.__update, "task_triggerGrid")
+
+    def stop(self):
+        taskMgr.remove("task_triggerGrid")
+        self.trackedNode = None
+        for cell in self.cells.values():
+            cell.unstash()
+
+    def __update(self, task):
+        pos = self.trackedNode.getPos(self.root)
+        for cell, center, radius in self.cellBounds:
+            if (center - pos).length() - radius < self.activeDistance:
+                if cell.isStashed():
+                    cell.unstash()
+            elif not cell.isStashed():
+                cell.stash()
+        return task.again
@@ -0,0 +1,109 @@
+"""A staged loading pipeline which spreads the construction of the game
+world over multiple frames and reports the real loading progress."""
+import logging
+from direct.showbase.DirectObject import DirectObject
+from panda3d.core import (
+    Filename,
+    VirtualFileSystem)
+
+
+class LoadingPipeline(DirectObject):
+    """Run a list of loading stages one after another. The model files a
+    stage needs are loaded asynchronously by the loader thread first, so
+    the stage itself will only get the already loaded models from the
+    model pool. Only one stage is run per frame so the window stays
+    responsive and the loading screen can be drawn in between. The
+    progress is calculated by the size of the files each stage reads."""
+    def __init__(self, name):
+        self.name = name
+        self.stages = []
+        self.totalWeight = 0
+        self.doneWeight = 0
+        self.currentStage = 0
+        self.preloadedStage = -1
+        self.preloadRequest = None
+        self.progressFunc = None
+        self.doneFunc = None
+        self.running = False
+
+    def addStage(self, func, models=[], files=[]):
+        """Add a new stage to the pipeline. func will be called without
+        arguments when the stage is run. The model files given in models
+        will be preloaded asynchronously before the stage is run, all
+        other files the stage reads, like sounds and textures, should be
+        given in files so their size is taken into account for the
+        progress calculation."""
+        weight = 0
+        for filename in models + files:
+            weight += self.__getFileSize(filename)
+        # stages that don't read any files still count a little bit
+        weight = max(weight, 1)
+        self.stages.append([func, models, weight])
+        self.totalWeight += weight
+
+    def __getFileSize(self, filename):
+        vfs = VirtualFileSystem.getGlobalPtr()
+        vfile = vfs.getFile(Filename(filename), True)
+        if vfile is None:
+            logging.warning("%s: can't find %s" % (self.name, filename))
+            return 0
+        return vfile.getFileSize()
+
+    def start(self, progressFunc, doneFunc):
+        """Start running the stages. progressFunc will be called with an
+        integer from 0 to 100 after each finished stage and doneFunc will
+        be called after the last stage is done."""
+        self.progressFunc = progressFunc
+        self.doneFunc = doneFunc
+        self.currentStage = 0
+        self.preloadedStage = -1
+        self.doneWeight = 0
+        self.running = True
+        self.progressFunc(0)
+        self.__preload()
+        taskMgr.add(self.__runStage, "%s_task" % self.name)
+
+    def stop(self):
+        """Stop the pipeline, the stages that already ran will not be
+        undone"""
+        taskMgr.remove("%s_task" % self.name)
+        if self.preloadRequest is not None:
+            loader.cancelRequest(self.preloadRequest)
+            self.preloadRequest = None
+        self.running = False
+
+    def isRunning(self):
+        return self.running
+
+    def __preload(self):
+        """Ask the loader thread to load the models of the current stage"""
+        models = self.stages[self.currentStage][1]
+        if models == []:
+            self.preloadedStage = self.currentStage
+            return
+        self.preloadRequest = loader.loadModel(
+            models,
+            callback=self.__preloadDone,
+            extraArgs=[self.currentStage])
+
+    def __preloadDone(self, models, stage):
+        # the models are kept in the model pool by the loader, so we
+        # don't need to hold any reference here
+        self.preloadRequest = None
+        self.preloadedStage = stage
+
+    def __runStage(self, task):
+        if self.preloadedStage != self.currentStage:
+            # still waiting for the loader thread
+            return task.cont
+        func, models, weight = self.stages[self.currentStage]
+        func()
+        self.doneWeight += weight
+        self.progressFunc(int(100 * self.doneWeight / self.totalWeight))
+        self.currentStage += 1
+        if self.currentStage == len(self.stages):
+            self.running = False
+            self.doneFunc()
+            return task.done
+        self.__preload()
+        return task.cont
@@ -107,7 +107,23 @@ nout.addFile(Filename(os.path.join(__builtin__.basedir, "game_p3d.log")))
 # LOGGING END
 #
 
+#
+# ASSET CACHE
+#
+# convert all models to bam files once and load them from the cache
+# on all following starts
+import assetcache
+__builtin__.cachedir = os.path.join(__builtin__.basedir, "cache")
+assetcache.setupModelCache(__builtin__.cachedir)
+#
+# ASSET CACHE END
+#
+
 from world import World
+from audiomanager import AudioManager
+from inputmap import InputMap
+from simclock import SimClock
+from combat import HitQueryService
 from gui.mainmenu import Menu
 from gui.optionsmenu import OptionsMenu
 import helper
@@ -122,6 +138,15 @@ class Main(ShowBase, FSM):
         #
         self.disableMouse()
         self.setBackgroundColor(0, 0, 0)
+        # music and sounds shared by all parts of the game
+        base.audio = AudioManager()
+        # the keys and buttons bound to the actions of the player
+        base.inputMap = InputMap()
+        # runs the movement and AI with a fixed time step
+        base.simClock = SimClock()
+        base.simClock.start()
+        # one-shot collision checks for the attacks
+        base.hitQueries = HitQueryService()
         self.camLens.setFov(75)
         self.camLens.setNear(0.8)
 
@@ -135,6 +160,7 @@ class Main(ShowBase, FSM):
         particles = ConfigVariableBool("particles-enabled", True).getValue()
         if particles:
             self.enableParticles()
+        base.torchFxBackend = ConfigVariableString("torch-fx-backend", "particles").getValue()
         base.textWriteSpeed = ConfigVariableDouble("text-write-speed",0.05).getValue()
         base.controlType = ConfigVariableString("control-type", "Gamepad").getValue()
         base.mouseSensitivity = ConfigVariableDouble("mouse-sensitivity",1.0).getValue()
@@ -168,7 +194,7 @@ class Main(ShowBase, FSM):
         self.menu = Menu()
         self.options = OptionsMenu()
 
-        self.musicMenu = loader.loadMusic("MayanJingle6_Menu.ogg")
+        self.musicMenu = base.audio.getMusic("MayanJingle6_Menu.ogg")
         self.musicMenu.setLoop(True)
 
         cm = CardMaker("menuFade")
@@ -214,6 +240,8 @@ class Main(ShowBase, FSM):
                 self.lerpAudioFadeIn)
 
         self.seqFade = None
+        # the world will be kept loaded after it has been started once
+        self.world = None
         self.acceptAll()
 
         self.request("Intro")
@@ -346,13 +374,20 @@ class Main(ShowBase, FSM):
         self.options.hide()
 
     def enterStart(self):
-        self.world = World()
-        self.world.start()
+        if self.world is None:
+            self.world = World()
+            self.world.load(self.world.start)
+        else:
+            # restart the already loaded world
+            self.world.reset()
+            self.world.start()
 
     def exitStart(self):
         self.world.stop()
-        self.world.cleanup()
-        del self.world
+        if not self.world.loaded:
+            # loading has been canceled, throw away what we've got so far
+            self.world.cleanup()
+            self.world = None
         self.fadeMusicIn.start()
 
     def __escape(self):
@@ -382,8 +417,9 @@ class Main(ShowBase, FSM):
         volume = str(round(base.musicManager.getVolume(), 2))
         mouseSens = str(base.mouseSensitivity)
         customConfigVariables = [
-            "", "particles-enabled", "text-write-speed", "audio-mute",
+            "", "particles-enabled", "torch-fx-backend", "text-write-speed", "audio-mute",
             "audio-volume", "control-type", "mouse-sensitivity"]
+        customConfigVariables += base.inputMap.getConfigVariableNames()
         if os.path.exists(prcFile):
             page = loadPrcFile(Filename.fromOsSpecific(prcFile))
             removeDecls = []
@@ -399,6 +435,7 @@ class Main(ShowBase, FSM):
             # Particles
             particles = "#f" if not base.particleMgrEnabled else "#t"
             page.makeDeclaration("particles-enabled", particles)
+            page.makeDeclaration("torch-fx-backend", base.torchFxBackend)
             # speed of the textwriter
             page.makeDeclaration("text-write-speed", textSpeed)
             # audio
@@ -408,6 +445,8 @@ class Main(ShowBase, FSM):
             # controls
             page.makeDeclaration("control-type", base.controlType)
             page.makeDeclaration("mouse-sensitivity", mouseSens)
+            for name, value in base.inputMap.getBindings():
+                page.makeDeclaration(name, value)
         else:
             cpMgr = ConfigPageManager.getGlobalPtr()
             page = cpMgr.makeExplicitPage("%s Pandaconfig"%appName)
@@ -421,6 +460,7 @@ class Main(ShowBase, FSM):
             page.makeDeclaration("fullscreen", "1")
             # particles
             page.makeDeclaration("particles-enabled", "#t")
+            page.makeDeclaration("torch-fx-backend", base.torchFxBackend)
             # speed of the textwriter
             page.makeDeclaration("text-write-speed", textSpeed)
             # audio
@@ -429,6 +469,8 @@ class Main(ShowBase, FSM):
             # player controls
             page.makeDeclaration("control-type", base.controlType)
             page.makeDeclaration("mouse-sensitivity", mouseSens)
+            for name, value in base.inputMap.getBindings():
+                page.makeDeclaration(name, value)
         # create a stream to the specified config file
         configfile = OFileStream(prcFile)
         # and now write it out
@@ -0,0 +1,98 @@
+"""Switches the music of the world between the ambient, fight and game
+over tracks.
+
+Every track has one fade in and one fade out interval which are created
+once and restarted for every transition. A fade that is still running
+when the music changes again gets stopped and the new fade continues
+from the current volume of the track, so fast changes between the states
+don't end up with overlapping fades fighting over the volume.
+"""
+from direct.fsm.FSM import FSM
+from direct.interval.LerpInterval import LerpFunc
+from direct.interval.IntervalGlobal import Sequence
+from direct.interval.FunctionInterval import Func
+
+class MusicDirector(FSM):
+    def __init__(self, tracks, fadeTime=1.0):
+        """tracks is a dict with the state names Ambient, Fight and
+        GameOver as keys and the music for these states as values"""
+        FSM.__init__(self, "FSM-MusicDirector")
+        self.tracks = tracks
+        self.fadeIns = {}
+        self.fadeOuts = {}
+        # the volume of the track when its last fade started
+        self.fadeStartVolume = {}
+        for name, track in tracks.items():
+            self.fadeStartVolume[name] = 0.0
+            self.fadeIns[name] = Sequence(
+                Func(self.__play, name),
+                LerpFunc(
+                    self.__fade,
+                    fromData=0.0,
+                    toData=1.0,
+                    duration=fadeTime,
+                    extraArgs=[name, True]),
+                name="MusicFadeIn-%s" % name)
+            self.fadeOuts[name] = Sequence(
+                LerpFunc(
+                    self.__fade,
+                    fromData=1.0,
+                    toData=0.0,
+                    duration=fadeTime,
+                    extraArgs=[name, False]),
+                Func(track.stop),
+                name="MusicFadeOut-%s" % name)
+
+    def cleanup(self):
+        self.request("Off")
+        FSM.cleanup(self)
+
+    def enterOff(self):
+        for name, track in self.tracks.items():
+            self.fadeIns[name].pause()
+            self.fadeOuts[name].pause()
+            track.stop()
+
+    def enterAmbient(self):
+        self.__fadeTo("Ambient")
+
+    def enterFight(self):
+        self.__fadeTo("Fight")
+
+    def enterGameOver(self):
+        self.__fadeTo("GameOver")
+
+    def __isPlaying(self, name):
+        track = self.tracks[name]
+        return track.status() == track.PLAYING
+
+    def __play(self, name):
+        if not self.__isPlaying(name):
+            self.tracks[name].setVolume(0.0)
+            self.tracks[name].play()
+
+    def __fade(self, t, name, fadeIn):
+        startVolume = self.fadeStartVolume[name]
+        if fadeIn:
+            volume = startVolume + (1.0 - startVolume) * t
+        else:
+            volume = startVolume * t
+        self.tracks[name].setVolume(volume)
+
+    def __fadeTo(self, target):
+        """Fade out all tracks but the target and fade the target in"""
+        for name in self.tracks.keys():
+            if name == target: continue
+            self.fadeIns[name].pause()
+            if self.__isPlaying(name) and not self.fadeOuts[name].isPlaying():
+                self.fadeStartVolume[name] = self.tracks[name].getVolume()
+                self.fadeOuts[name].start()
+
+        self.fadeOuts[target].pause()
+        if self.fadeIns[target].isPlaying():
+            return
+        if self.__isPlaying(target):
+            self.fadeStartVolume[target] = self.tracks[target].getVolume()
+        else:
+            self.fadeStartVolume[target] = 0.0
+        self.fadeIns[target].start()
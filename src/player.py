@@ -15,8 +15,10 @@ from panda3d.core import (
     CollisionNode,
     CollisionHandlerFloor,
     CollisionHandlerEvent,
-    CollisionHandlerQueue,
     PointLight)
+import collisionmasks
+import simclock
+from gamepad import GamepadInput
 from direct.interval.IntervalGlobal import Sequence
 from direct.interval.FunctionInterval import (
     Wait,
@@ -26,6 +28,10 @@ try:
 except:
 	pass
 
+# the start and end point of the segment that checks what an attack of the
+# player hits, relative to the player
+ATTACKSEGMENT = (Point3(0, 0, 1), Point3(0, -1.3, 1))
+
 class Player(FSM, DirectObject):
     NormalMode = "Normal"
     FightMode = "Fight"
@@ -72,8 +78,12 @@ class Player(FSM, DirectObject):
         self.camFloater.setPos(0, 0, 1.5)
         self.camFloater.reparentTo(self.player)
         # screen sizes
-        self.winXhalf = base.win.getXSize() / 2
-        self.winYhalf = base.win.getYSize() / 2
+        self.winXhalf = 0
+        self.winYhalf = 0
+        if base.win is not None:
+            # there is no window if we run headless
+            self.winXhalf = base.win.getXSize() / 2
+            self.winYhalf = base.win.getYSize() / 2
         # Interval for the jump animation
         self.jumpInterval = None
         self.jumpstartFloater = NodePath(PandaNode("jumpstartFloater"))
@@ -88,6 +98,7 @@ class Player(FSM, DirectObject):
                 self.mainJoystick = joysticks[0]
                 self.mainJoystick.init()
                 self.hasJoystick = True
+                self.gamepad = GamepadInput(self.mainJoystick)
 
         #
         # WEAPONS AND ACCESSORIES
@@ -109,13 +120,19 @@ class Player(FSM, DirectObject):
         self.playerSphere = CollisionSphere(0, 0, 0.8, 0.7)
         self.playerCollision = self.player.attachNewNode(CollisionNode("playerCollision"))
         self.playerCollision.node().addSolid(self.playerSphere)
+        self.playerCollision.node().setFromCollideMask(
+            collisionmasks.WALLS | collisionmasks.TRIGGERS |
+            collisionmasks.ENEMIES | collisionmasks.HAZARDS)
+        self.playerCollision.node().setIntoCollideMask(collisionmasks.PLAYER)
         base.pusher.addCollider(self.playerCollision, self.player)
         base.cTrav.addCollider(self.playerCollision, base.pusher)
         # The foot collision checks
         self.footRay = CollisionRay(0, 0, 0, 0, 0, -1)
         self.playerFootRay = self.player.attachNewNode(CollisionNode("playerFootCollision"))
         self.playerFootRay.node().addSolid(self.footRay)
-        self.playerFootRay.node().setIntoCollideMask(0)
+        collisionmasks.setFromMask(
+            self.playerFootRay,
+            collisionmasks.FLOOR | collisionmasks.WALLS)
         self.lifter = CollisionHandlerFloor()
         self.lifter.addCollider(self.playerFootRay, self.player)
         self.lifter.setMaxVelocity(5)
@@ -124,26 +141,19 @@ class Player(FSM, DirectObject):
         self.jumpCheckSegment = CollisionSegment(0, -0.2, 0.5, 0, -0.2, -2)
         self.playerJumpRay = self.player.attachNewNode(CollisionNode("playerJumpCollision"))
         self.playerJumpRay.node().addSolid(self.jumpCheckSegment)
-        self.playerJumpRay.node().setIntoCollideMask(0)
+        collisionmasks.setFromMask(self.playerJumpRay, collisionmasks.FLOOR)
         self.jumper = CollisionHandlerEvent()
         self.jumper.addOutPattern('%fn-out')
         base.cTrav.addCollider(self.playerJumpRay, self.jumper)
-        # a collision segment to check attacks
-        self.attackCheckSegment = CollisionSegment(0, 0, 1, 0, -1.3, 1)
-        self.playerAttackRay = self.player.attachNewNode(CollisionNode("playerAttackCollision"))
-        self.playerAttackRay.node().addSolid(self.attackCheckSegment)
-        self.playerAttackRay.node().setIntoCollideMask(0)
-        self.attackqueue = CollisionHandlerQueue()
-        base.cTrav.addCollider(self.playerAttackRay, self.attackqueue)
 
         #
         # SOUNDEFFECTS
         #
-        self.footstep = loader.loadSfx("Footstep.ogg")
+        self.footstep = base.audio.getSfx("Footstep.ogg")
         self.footstep.setLoop(True)
         self.footstep.setPlayRate(1.5)
         self.footstep.setVolume(0.5)
-        self.spearAttackSfx = loader.loadSfx("SpearAttack.ogg")
+        self.spearAttackSfx = base.audio.getSfx("SpearAttack.ogg")
         self.spearAttackSfx.setVolume(0.5)
 
     #
@@ -153,6 +163,7 @@ class Player(FSM, DirectObject):
         self.player.setPos(startPoint.getPos())
         self.player.setHpr(startPoint.getHpr())
         self.player.reparentTo(render)
+        self.player.show()
         self.jumpstartFloater.setPos(self.player.getPos())
 
         self.keyMap = {"horizontal":0, "vertical":0}
@@ -170,44 +181,32 @@ class Player(FSM, DirectObject):
         self.mouseSpeedY = 0.2 * base.mouseSensitivity
         self.speed = 1.0
 
-        self.camCenterEvents = ["centerCam", "home", "q"]
-        self.camZoomInEvents = ["zoomIn", "+", "wheel_up"]
-        self.camZoomOutEvents = ["zoomOut", "-", "wheel_down"]
-        self.actionEvents = ["doAction", "enter", "e"]
-
-        self.accept("arrow_left", self.setKey, ["horizontal",1])
-        self.accept("arrow_right", self.setKey, ["horizontal",-1])
-        self.accept("arrow_up", self.setKey, ["vertical",-1])
-        self.accept("arrow_down", self.setKey, ["vertical",1])
-        self.accept("arrow_left-up", self.setKey, ["horizontal",0])
-        self.accept("arrow_right-up", self.setKey, ["horizontal",0])
-        self.accept("arrow_up-up", self.setKey, ["vertical",0])
-        self.accept("arrow_down-up", self.setKey, ["vertical",0])
-        self.accept("a", self.setKey, ["horizontal",1])
-        self.accept("d", self.setKey, ["horizontal",-1])
-        self.accept("w", self.setKey, ["vertical",-1])
-        self.accept("s", self.setKey, ["vertical",1])
-        self.accept("a-up", self.setKey, ["horizontal",0])
-        self.accept("d-up", self.setKey, ["horizontal",0])
-        self.accept("w-up", self.setKey, ["vertical",0])
-        self.accept("s-up", self.setKey, ["vertical",0])
-        for event in self.camCenterEvents:
-            self.acceptOnce(event, self.center)
-        for event in self.camZoomInEvents:
-            self.acceptOnce(event, self.zoom, [True])
-        for event in self.camZoomOutEvents:
-            self.acceptOnce(event, self.zoom, [False])
-        for event in self.actionEvents:
-            self.acceptOnce(event, self.request, ["Action"])
+        # the input map sends these events for the keys bound to the actions
+        self.accept("input-left", self.setKey, ["horizontal",1])
+        self.accept("input-right", self.setKey, ["horizontal",-1])
+        self.accept("input-forward", self.setKey, ["vertical",-1])
+        self.accept("input-backward", self.setKey, ["vertical",1])
+        self.accept("input-left-up", self.setKey, ["horizontal",0])
+        self.accept("input-right-up", self.setKey, ["horizontal",0])
+        self.accept("input-forward-up", self.setKey, ["vertical",0])
+        self.accept("input-backward-up", self.setKey, ["vertical",0])
+        self.accept("input-centerCam", self.center)
+        self.accept("input-zoomIn", self.zoom, [True])
+        self.accept("input-zoomOut", self.zoom, [False])
+        self.accept("input-action", self.requestAction)
         self.accept("ActionDone", self.request, ["Idle"])
 
         self.accept("playerJumpCollision-out", self.jump)
 
-        taskMgr.add(self.move, "task_movement", priority=-10)
-        taskMgr.add(self.updateCam, "task_camActualisation", priority=-4)
+        base.simClock.add("task_movement", self.move)
+        base.simClock.addInterpolated(self.player)
+        # the cam follows the interpolated position of the player
+        taskMgr.add(self.updateCam, "task_camActualisation", sort=simclock.PRESENTATIONSORT)
 
         if self.hasJoystick:
-            taskMgr.add(self.gamepadLoop, "task_gamepad_loop", priority=-5)
+            self.accept("gamepad-axis0", self.setAxis, ["horizontal", -1])
+            self.accept("gamepad-axis1", self.setAxis, ["vertical", 1])
+            self.gamepad.start()
 
         camera.setPos(self.player, 0, self.camDistance, self.camHeightAvg)
 
@@ -217,12 +216,28 @@ class Player(FSM, DirectObject):
         self.request("Idle")
 
     def stop(self):
-        taskMgr.remove("task_movement")
+        base.simClock.remove("task_movement")
+        base.simClock.removeInterpolated(self.player)
         taskMgr.remove("task_camActualisation")
-        taskMgr.remove("task_gamepad_loop")
+        if self.hasJoystick:
+            self.gamepad.stop()
         self.ignoreAll()
         self.player.hide()
 
+    def reset(self):
+        """Bring the player back to the initial state, the position will
+        be set again by start"""
+        if self.deathComplete is not None:
+            self.deathComplete.pause()
+            self.deathComplete = None
+        if self.jumpInterval is not None:
+            self.jumpInterval.pause()
+            self.jumpInterval = None
+        self.footstep.stop()
+        self.player.stop()
+        self.jumper.clear()
+        self.request("Off")
+
     def cleanup(self):
         self.stop()
         if self.deathComplete is not None:
@@ -275,27 +290,6 @@ class Player(FSM, DirectObject):
         self.mode = Player.NormalMode
         base.messenger.send("ExitFightMode")
 
-    def gamepadLoop(self, task):
-        joymap = {
-            0:"doAction",
-            5:"centerCam",
-            6:"zoomIn",
-            4:"zoomOut",
-            9:"escape"}
-        for event in pygame.event.get():
-            for button in range(self.mainJoystick.get_numbuttons()):
-                if button in joymap and self.mainJoystick.get_button(button):
-                    base.messenger.send(joymap[button])
-            if event.type == pygame.JOYAXISMOTION:
-                for axis in range(self.mainJoystick.get_numaxes()):
-                    axisChange = 0.0
-                    axisChange = self.mainJoystick.get_axis(axis)
-                    if axis == 0:
-                        self.setKey("horizontal", -axisChange)
-                    if axis == 1:
-                        self.setKey("vertical", axisChange)
-        return task.cont
-
     def setAnimationSpeed(self, requestedState):
         if requestedState == "Run":
             self.player.setPlayRate(3 * self.speed, "Run")
@@ -312,8 +306,12 @@ class Player(FSM, DirectObject):
     def setKey(self, key, value):
         self.keyMap[key] = value
 
-    def move(self, task):
-        dt = globalClock.getDt()
+    def setAxis(self, key, direction, value):
+        self.keyMap[key] = direction * value
+
+    def move(self, dt):
+        """One step of the player movement, this is called by the simulation
+        clock with its fixed step time"""
         resetMouse = False
 
         def resetMouse():
@@ -323,24 +321,23 @@ class Player(FSM, DirectObject):
         if self.player.getAnimControl("Hit").isPlaying() or \
             self.player.getAnimControl("Death").isPlaying():
             resetMouse()
-            return task.cont
+            return
         if self.deathComplete is not None:
             if self.deathComplete.isPlaying():
                 resetMouse()
-                return task.cont
+                return
         if self.jumpInterval is not None:
             if self.jumpInterval.isPlaying():
                 resetMouse()
-                return task.cont
+                return
         if self.isActionmove:
             resetMouse()
-            return task.cont
+            return
 
         if self.mode == Player.NormalMode:
             self.__normalMove(dt)
         else:
             self.__fightMove(dt)
-        return task.cont
 
     def __normalMove(self, dt):
         requestState = "Idle"
@@ -450,13 +447,9 @@ class Player(FSM, DirectObject):
         if zoomIn:
             if camdist > self.minCamDistance + 0.5:
                 zoom = 0.5
-            for event in self.camZoomInEvents:
-                self.acceptOnce(event, self.zoom, [True])
         else:
             if camdist < self.maxCamDistance - 0.5:
                 zoom = -0.5
-            for event in self.camZoomOutEvents:
-                self.acceptOnce(event, self.zoom, [False])
         camera.setPos(camera, 0, zoom, 0)
 
     def center(self):
@@ -467,8 +460,6 @@ class Player(FSM, DirectObject):
         # get the cameras current offset to the player model on the z-axis
         offsetZ = camera.getZ() - self.player.getZ()
         camera.setPos(self.player, 0, camdist, offsetZ)
-        for event in self.camCenterEvents:
-            self.acceptOnce(event, self.center)
 
     def __normalCam(self):
         """This function will check the min and max distance of the camera to
@@ -566,10 +557,13 @@ class Player(FSM, DirectObject):
             self.__enterFightAttack()
         self.accept("ActionDone", self.__exitAction)
 
+    def requestAction(self):
+        # ignore the action key until the current action is done
+        if self.isActionmove: return
+        self.request("Action")
+
     def __exitAction(self):
         self.isActionmove = False
-        for event in self.actionEvents:
-            self.acceptOnce(event, self.request, ["Action"])
 
     def __enterActivate(self):
         activateAnim = self.player.actorInterval(
@@ -612,12 +606,16 @@ class Player(FSM, DirectObject):
         attackAnim.setDoneEvent("ActionDone")
         attackAnim.start()
         self.spearAttackSfx.play()
-        for i in range(self.attackqueue.getNumEntries()):
-            entry = self.attackqueue.getEntry(i)
+        # check what the spear hits in front of the player
+        for entry in base.hitQueries.querySegment(
+                self.player,
+                ATTACKSEGMENT[0],
+                ATTACKSEGMENT[1],
+                collisionmasks.ENEMIES):
             into = entry.getIntoNode()
             if "golemHitField" in into.getName():
                 if random.random() > .15:
-                    base.messenger.send("HitEnemy")
+                    base.messenger.send("HitEnemy", [entry.getIntoNodePath()])
         self.footstep.stop()
 
     def enterFightLeft(self):
@@ -0,0 +1,112 @@
+"""A per task frame time profiler with an on screen overlay and csv export.
+
+The task manager already measures how long each task ran in the last
+frame, so the profiler doesn't have to wrap any of the game tasks. It
+simply reads the timings of the watched tasks at the end of every frame
+and stores them in a ring buffer. The collision traversal is done by the
+collisionLoop task of the ShowBase, so it's measured the same way.
+"""
+import os
+import time
+import logging
+from collections import deque
+from direct.showbase.DirectObject import DirectObject
+from direct.gui.OnscreenText import OnscreenText
+from panda3d.core import TextNode
+
+# the tasks of the game that will be watched by default
+DEFAULTTASKS = [
+    "task_simulation",
+    "task_simInterpolation",
+    "task_camActualisation",
+    "task_gamepad_loop",
+    "writeText",
+    "collisionLoop"]
+
+class FrameProfiler(DirectObject):
+    def __init__(self, taskNames=DEFAULTTASKS, numFrames=600):
+        self.taskNames = list(taskNames)
+        # ring buffer with one entry per frame
+        self.frames = deque(maxlen=numFrames)
+        self.lastFrameTime = None
+        self.overlay = OnscreenText(
+            text = "",
+            pos = (0.05, -0.1),
+            scale = 0.045,
+            fg = (1, 1, 0, 1),
+            shadow = (0, 0, 0, 1),
+            align = TextNode.ALeft,
+            mayChange = True)
+        self.overlay.reparentTo(base.a2dTopLeft)
+        self.overlay.hide()
+        self.showOverlay = False
+
+    def start(self):
+        # run after every other task of the frame
+        taskMgr.add(self.__recordFrame, "task_frameProfiler", sort=1000)
+
+    def stop(self):
+        taskMgr.remove("task_frameProfiler")
+        taskMgr.remove("task_frameProfilerOverlay")
+
+    def toggleOverlay(self):
+        self.showOverlay = not self.showOverlay
+        if self.showOverlay:
+            self.overlay.show()
+            taskMgr.doMethodLater(0.5, self.__updateOverlay, "task_frameProfilerOverlay")
+        else:
+            self.overlay.hide()
+            taskMgr.remove("task_frameProfilerOverlay")
+
+    def __recordFrame(self, task):
+        now = globalClock.getRealTime()
+        frameTime = 0.0
+        if self.lastFrameTime is not None:
+            frameTime = (now - self.lastFrameTime) * 1000.0
+        self.lastFrameTime = now
+        timings = []
+        for name in self.taskNames:
+            taskTime = 0.0
+            for watchedTask in taskMgr.getTasksNamed(name):
+                taskTime += watchedTask.getDt() * 1000.0
+            timings.append(taskTime)
+        self.frames.append((globalClock.getFrameCount(), frameTime, timings))
+        return task.cont
+
+    def getAverages(self):
+        """Returns the average frame time and a list with the average time
+        of each watched task, all in ms"""
+        if len(self.frames) == 0:
+            return 0.0, [0.0] * len(self.taskNames)
+        frameSum = 0.0
+        taskSums = [0.0] * len(self.taskNames)
+        for frame, frameTime, timings in self.frames:
+            frameSum += frameTime
+            for i in range(len(timings)):
+                taskSums[i] += timings[i]
+        num = float(len(self.frames))
+        return frameSum / num, [taskSum / num for taskSum in taskSums]
+
+    def __updateOverlay(self, task):
+        frameAvg, taskAvgs = self.getAverages()
+        lines = ["frame: %.2f ms" % frameAvg]
+        for i in range(len(self.taskNames)):
+            lines.append("%s: %.3f ms" % (self.taskNames[i], taskAvgs[i]))
+        self.overlay.setText("\n".join(lines))
+        return task.again
+
+    def writeCSV(self, path=None):
+        """Write all recorded frames to a csv file, by default in the
+        basedir of the game"""
+        if len(self.frames) == 0: return
+        if path is None:
+            path = os.path.join(
+                basedir,
+                "profile" + time.strftime("_%d-%m-%Y_%H-%M-%S") + ".csv")
+        with open(path, "w") as csvfile:
+            csvfile.write(",".join(["frame", "frame_ms"] + self.taskNames) + "\n")
+            for frame, frameTime, timings in self.frames:
+                values = ["%d" % frame, "%.4f" % frameTime]
+                values += ["%.4f" % taskTime for taskTime in timings]
+                csvfile.write(",".join(values) + "\n")
+        logging.info("frame profile written to %s" % path)
@@ -0,0 +1,103 @@
+"""Fixed time step simulation of the game.
+
+The movement of the player and the AI of the enemies are advanced in steps
+of a fixed length, sim-step-rate times per second, independent of the
+frame rate. A slow frame runs more steps, at most sim-max-steps, a fast
+frame may run none at all. So the game behaves the same at 30 and 144 fps
+and the headless runs are reproducible.
+
+To not let the movement stutter, the nodes added with addInterpolated are
+shown in between their positions of the last two steps while rendering.
+Before the next steps run they are put back to their real position.
+"""
+from direct.showbase.DirectObject import DirectObject
+from panda3d.core import (
+    ConfigVariableDouble,
+    ConfigVariableInt)
+
+# the sort of the task that moves the nodes to their interpolated positions,
+# this runs after the collision traversal of the ShowBase (sort 30)
+INTERPOLATIONSORT = 35
+# tasks that work with the interpolated positions, like the camera, have
+# to be added with this sort
+PRESENTATIONSORT = 40
+
+class SimClock(DirectObject):
+    def __init__(self):
+        self.stepTime = 1.0 / ConfigVariableDouble("sim-step-rate", 60.0).getValue()
+        self.maxSteps = ConfigVariableInt("sim-max-steps", 5).getValue()
+        self.accumulator = 0.0
+        # the [name, function] of everything that has to be stepped
+        self.steppers = []
+        # the previous, current and rendered position of interpolated nodes
+        self.nodes = {}
+
+    def start(self):
+        self.accumulator = 0.0
+        taskMgr.add(self.__simulate, "task_simulation", priority=-10)
+        taskMgr.add(self.__interpolate, "task_simInterpolation", sort=INTERPOLATIONSORT)
+
+    def stop(self):
+        taskMgr.remove("task_simulation")
+        taskMgr.remove("task_simInterpolation")
+
+    def add(self, name, function):
+        """Call the function with the step time as argument on every
+        simulation step. Functions are called in the order they were
+        added."""
+        self.remove(name)
+        self.steppers.append([name, function])
+
+    def remove(self, name):
+        self.steppers = [stepper for stepper in self.steppers if stepper[0] != name]
+
+    def addInterpolated(self, np):
+        self.snap(np)
+
+    def removeInterpolated(self, np):
+        if np in self.nodes:
+            del self.nodes[np]
+
+    def snap(self, np):
+        """Take the current position of the node as it is, without
+        interpolating from the old one. Nodes that get moved outside of
+        the simulation, e.g. by setPos or an interval, are snapped
+        automatically."""
+        pos = np.getPos()
+        self.nodes[np] = [pos, pos, pos]
+
+    def __restore(self):
+        for np, poses in self.nodes.items():
+            if (np.getPos() - poses[2]).lengthSquared() > 0.000001:
+                # moved by someone else since it has been rendered
+                self.snap(np)
+            else:
+                np.setPos(poses[1])
+
+    def __simulate(self, task):
+        self.__restore()
+        self.accumulator += globalClock.getDt()
+        steps = 0
+        while self.accumulator >= self.stepTime and steps < self.maxSteps:
+            # remember where the nodes are before the step, so the last
+            # step of the frame gets interpolated
+            for np, poses in self.nodes.items():
+                poses[0] = np.getPos()
+            for name, function in list(self.steppers):
+                function(self.stepTime)
+            self.accumulator -= self.stepTime
+            steps += 1
+        if self.accumulator >= self.stepTime:
+            # the simulation can't keep up, drop the time that is left
+            self.accumulator %= self.stepTime
+        return task.cont
+
+    def __interpolate(self, task):
+        alpha = self.accumulator / self.stepTime
+        for np, poses in self.nodes.items():
+            # the collisions have been handled now, so this is the real
+            # position of the last step
+            poses[1] = np.getPos()
+            poses[2] = poses[0] + (poses[1] - poses[0]) * alpha
+            np.setPos(poses[2])
+        return task.cont
@@ -1,58 +1,114 @@
 from level.level01 import Level01
 from player import Player
-from golem import Golem
+from enemymanager import EnemyManager
 from gui.textfield import MessageWriter
 from gui.hud import PlayerHUD
 from gui.loadingscreen import LoadingScreen
 from gui.gameOverScreen import GameOverScreen
+from loadingpipeline import LoadingPipeline
+from musicdirector import MusicDirector
 from direct.showbase.DirectObject import DirectObject
-from direct.interval.LerpInterval import LerpFunc
-from direct.interval.IntervalGlobal import Sequence
-from direct.interval.FunctionInterval import Func
 import helper
 import time
 
 class World(DirectObject):
     def __init__(self):
         self.loadingscreen = LoadingScreen()
+        self.level = None
+        self.player = None
+        self.enemies = None
+        self.loaded = False
+
+        # setup the stages to load the world, the given files will be used
+        # to calculate the real loading progress
+        self.pipeline = LoadingPipeline("worldLoading")
+        self.pipeline.addStage(
+            self.__loadGameOverScreen,
+            files=["Logo.png"])
+        self.pipeline.addStage(
+            self.__loadLevel,
+            models=[
+                "Key.egg", "Artifact.egg", "Heart.egg",
+                "Switch-Activate.egg", "Box_long_looseLid-open.egg",
+                "Boulder_Door-open.egg", "Wood_Door_Basic-open.egg"],
+            # the level itself is loaded from the asset cache as the
+            # flattened Level-static model, Level.egg only counts for the
+            # progress
+            files=["Level.egg", "Floor.png", "Walls.png", "Ceiling.png", "Plate.png"])
+        self.pipeline.addStage(
+            self.__loadPlayer,
+            models=[
+                "Character.egg", "Character-Idle.egg", "Character-Run.egg",
+                "Character-Activate.egg", "Character-Death.egg",
+                "Character-Jump.egg", "Character-Hit.egg",
+                "Character-FightAttack.egg", "Character-FightIdle.egg",
+                "Character-FightLeft.egg", "Character-FightRight.egg",
+                "Spear.egg", "Shield.egg"],
+            files=["Footstep.ogg", "SpearAttack.ogg"])
+        self.pipeline.addStage(
+            self.__loadGolem,
+            models=[
+                "Golem.egg", "Golem-Idle.egg", "Golem-Walk.egg",
+                "Golem-Attack.egg", "Golem-Destroyed.egg"])
+        self.pipeline.addStage(
+            self.__loadGui,
+            files=["HeartIcon.png", "Keys.png"])
+        self.pipeline.addStage(
+            self.__loadAudio,
+            files=["MayanJingle4_PuzzleSolved.ogg", "MayanJingle2_GetItem.ogg"])
+
+    def load(self, doneFunc):
+        """Load the world step by step and call doneFunc when everything
+        is loaded"""
         self.loadingscreen.show()
+        self.pipeline.start(self.loadingscreen.setLoadingValue, doneFunc)
+
+    def __loadGameOverScreen(self):
         self.gameoverscreen = GameOverScreen()
+
+    def __loadLevel(self):
         self.level = Level01()
-        self.loadingscreen.setLoadingValue(10)
+
+    def __loadPlayer(self):
         self.player = Player()
-        self.loadingscreen.setLoadingValue(15)
-        self.golem = Golem()
-        self.loadingscreen.setLoadingValue(20)
+
+    def __loadGolem(self):
+        self.enemies = EnemyManager(self.level.navMesh)
+        self.enemies.spawn(self.level.getGolemStartPoints())
+
+    def __loadGui(self):
         self.msgWriter = MessageWriter()
-        self.loadingscreen.setLoadingValue(25)
         self.hud = PlayerHUD()
-        self.loadingscreen.setLoadingValue(30)
 
-        self.musicAmbient = loader.loadMusic("MayanJingle1_Ambient.ogg")
+    def __loadAudio(self):
+        # the music is streamed and the sounds come from the shared cache,
+        # so this is cheap even when the world gets rebuilt
+        self.musicAmbient = base.audio.getMusic("MayanJingle1_Ambient.ogg")
         self.musicAmbient.setLoop(True)
         self.musicAmbient.setVolume(1.0)
-        self.musicFight = loader.loadMusic("MayanJingle3_Fight.ogg")
+        self.musicFight = base.audio.getMusic("MayanJingle3_Fight.ogg")
         self.musicFight.setLoop(True)
         self.musicFight.setVolume(1.0)
-        self.musicGameOver = loader.loadMusic("MayanJingle5_GameOver.ogg")
+        self.musicGameOver = base.audio.getMusic("MayanJingle5_GameOver.ogg")
         self.musicGameOver.setVolume(1.0)
-        self.puzzleSolved = loader.loadSfx("MayanJingle4_PuzzleSolved.ogg")
-        self.getItem = loader.loadSfx("MayanJingle2_GetItem.ogg")
-        self.loadingscreen.setLoadingValue(40)
+        self.puzzleSolved = base.audio.getSfx("MayanJingle4_PuzzleSolved.ogg")
+        self.getItem = base.audio.getSfx("MayanJingle2_GetItem.ogg")
+        self.music = MusicDirector({
+            "Ambient": self.musicAmbient,
+            "Fight": self.musicFight,
+            "GameOver": self.musicGameOver})
+        self.loaded = True
 
     def start(self):
         helper.hide_cursor()
-        self.level.start()
-        self.loadingscreen.setLoadingValue(55)
+        self.level.start(self.player.player)
         self.player.start(self.level.getPlayerStartPoint())
-        self.loadingscreen.setLoadingValue(65)
         self.hud.show()
         self.hud.updateKeyCount(0)
-        self.loadingscreen.setLoadingValue(75)
-        self.golem.start(self.level.getGolemStartPoint())
-        self.loadingscreen.setLoadingValue(85)
+        self.hud.setHealthStatus(self.player.health)
+        self.enemies.start(self.player.player)
 
-        self.playMusic("Ambient")
+        self.music.request("Ambient")
 
         # catch all events that go from one class to another within the world
         # NOTE: events that stay in one class can be catched in the class itself
@@ -62,19 +118,17 @@ class World(DirectObject):
         self.accept("ActionActive", self.hud.showActionKey)
         self.accept("ActionDeactive", self.hud.hideActionKey)
         self.accept("EnterFightMode", self.enterFight)
-        self.accept("ExitFightMode", self.playMusic, ["ambient"])
+        self.accept("ExitFightMode", self.music.request, ["Ambient"])
         self.accept("PuzzleSolved", self.playSfx, ["puzzleSolved"])
         self.accept("updateKeyCount", self.hud.updateKeyCount)
         self.accept("player-die", self.player.die)
         self.accept("player-heal", self.player.heal)
         self.accept("setHealth", self.hud.setHealthStatus)
         self.accept("golemSeesPlayer", self.player.enterFightMode)
-        self.accept("HitEnemy", self.golem.hit)
         self.accept("HitPlayer", self.player.hit)
         self.accept("GolemDestroyed", self.exitFight)
         self.accept("GameOver", self.gameOver)
         self.accept("Exit", base.messenger.send, ["escape"])
-        self.loadingscreen.setLoadingValue(100)
         self.loadingscreen.hide()
         self.startTime = time.time()
         base.messenger.send(
@@ -83,100 +137,57 @@ class World(DirectObject):
 
     def stop(self):
         helper.show_cursor()
+        if not self.loaded:
+            # the world has been left while it was still loading
+            self.pipeline.stop()
+            self.loadingscreen.hide()
+            return
         self.level.stop()
         self.player.stop()
-        self.golem.stop()
+        self.enemies.stop()
         self.hud.hide()
         self.msgWriter.hide()
         self.gameoverscreen.hide()
         self.ignoreAll()
-        self.musicAmbient.stop()
-        self.musicFight.stop()
+        self.music.request("Off")
+
+    def reset(self):
+        """Reset the level, player and golem to their initial state so the
+        world can be started again without reloading any assets"""
+        self.level.reset()
+        self.player.reset()
+        self.enemies.reset()
+        self.msgWriter.clear()
 
     def cleanup(self):
-        self.player.cleanup()
+        if self.loaded:
+            self.music.cleanup()
+        if self.player is not None:
+            self.player.cleanup()
         del self.player
-        self.golem.cleanup()
-        del self.golem
+        if self.enemies is not None:
+            self.enemies.cleanup()
+        del self.enemies
         base.cTrav.clearColliders()
 
     def enterFight(self):
-        self.playMusic("Fight")
-        self.golem.activate(self.player.player)
-
-    def exitFight(self):
-        self.playMusic("Ambient")
-        self.level.defeatEnemy("Golem")
+        self.music.request("Fight")
+
+    def exitFight(self, golem):
+        self.level.defeatEnemy(golem.name)
+        # the event is sent while the golem is still changing into its
+        # Destroyed state, so it may still count as active
+        remaining = [other for other in self.enemies.getActiveGolems()
+                     if other is not golem]
+        if remaining:
+            # go on fighting the next golem
+            self.player.enterFightMode(remaining[0].golem)
+            return
+        self.music.request("Ambient")
         self.player.exitFightMode()
 
-    def audioFade(self, volume, audio):
-        audio.setVolume(volume)
-
-    def playMusic(self, music):
-        curMusic = None
-        nextMusic = None
-        # get the current running music
-        if self.musicAmbient.status() == self.musicAmbient.PLAYING:
-            curMusic = self.musicAmbient
-        if self.musicFight.status() == self.musicFight.PLAYING:
-            curMusic = self.musicFight
-        if self.musicGameOver.status() == self.musicGameOver.PLAYING:
-            curMusic = self.musicGameOver
-
-        # check which music we want to play next
-        if music == "Fight":
-            nextMusic = self.musicFight
-        elif music == "Ambient":
-            nextMusic = self.musicAmbient
-        elif music == "GameOver":
-            nextMusic = self.musicGameOver
-        else:
-            # stop all music
-            self.musicFight.stop()
-            self.musicAmbient.stop()
-            self.musicGameOver.stop()
-
-        fade = None
-        if curMusic != None and nextMusic != None:
-            # fade from cur to next
-            # fade in the new music
-            lerpAudioFadeOut = LerpFunc(
-                self.audioFade,
-                fromData=1,
-                toData=0,
-                duration=1.0,
-                extraArgs=[curMusic])
-            lerpAudioFadeIn = LerpFunc(
-                self.audioFade,
-                fromData=0,
-                toData=1,
-                duration=1.0,
-                extraArgs=[nextMusic])
-            fade = Sequence(
-                lerpAudioFadeOut,
-                Func(curMusic.stop),
-                Func(nextMusic.play),
-                lerpAudioFadeIn,
-                name="FadeMusic"
-            )
-
-        elif nextMusic != None:
-            lerpAudioFadeIn = LerpFunc(
-                self.audioFade,
-                fromData = 0,
-                toData = 1,
-                duration = 1.0,
-                extraArgs = [nextMusic])
-            fade = Sequence(
-                Func(nextMusic.play),
-                lerpAudioFadeIn,
-                name="FadeMusic"
-            )
-        if fade != None:
-            fade.start()
-
     def gameOver(self, winLoose):
-        self.playMusic("GameOver")
+        self.music.request("GameOver")
         helper.show_cursor()
         self.player.stop()
         self.endTime = time.time()
@@ -0,0 +1,20 @@
+"""Tests for the asset pipeline of the game.
+
+Run them from the root folder of the repository with:
+python -m unittest discover -t . -s tests
+"""
+import os
+import sys
+import __builtin__
+
+# the game modules import each other relative to the src folder
+SRCDIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+if SRCDIR not in sys.path:
+    sys.path.insert(0, SRCDIR)
+
+def setUpBase():
+    """Create a ShowBase without a window, once for all tests"""
+    if hasattr(__builtin__, "base"): return
+    import headless
+    headless.setupEnvironment("none")
+    headless.createBase()
@@ -0,0 +1,44 @@
+import unittest
+from panda3d.core import (
+    CollisionPolygon,
+    Point3)
+from level import collisionproxy
+
+# a floor polygon of Level.egg that starts with three collinear points
+PENTAGON = [
+    Point3(5, 61, 0),
+    Point3(7, 61, 0),
+    Point3(8, 61, 0),
+    Point3(6, 65, 0),
+    Point3(5, 65, 0)]
+
+def getArea(solids):
+    """Returns the summed up area of the given collision polygons"""
+    area = 0.0
+    for solid in solids:
+        points = [solid.getPoint(i) for i in range(solid.getNumPoints())]
+        for i in range(1, len(points) - 1):
+            area += (points[i] - points[0]).cross(points[i + 1] - points[0]).length() / 2.0
+    return area
+
+class SimplifyTest(unittest.TestCase):
+    def testNormalOfPolygonStartingCollinear(self):
+        normal = collisionproxy.getNormal(PENTAGON)
+        self.assertIsNotNone(normal)
+        self.assertAlmostEqual(normal.getZ(), 1.0)
+
+    def testPolygonStartingCollinearIsKept(self):
+        solids = collisionproxy.simplify([PENTAGON])
+        self.assertGreater(len(solids), 0)
+        for solid in solids:
+            self.assertIsInstance(solid, CollisionPolygon)
+            self.assertFalse(solid.getBounds().isEmpty())
+        # 3 * 4 rectangle with a triangle of 2 * 4 / 2 cut off
+        self.assertAlmostEqual(getArea(solids), 8.0, places=4)
+
+    def testDegeneratedPolygonIsDropped(self):
+        line = [Point3(0, 0, 0), Point3(1, 0, 0), Point3(2, 0, 0)]
+        self.assertEqual(collisionproxy.simplify([line]), [])
+
+if __name__ == "__main__":
+    unittest.main()
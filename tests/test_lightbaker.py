@@ -0,0 +1,70 @@
+import unittest
+from panda3d.core import (
+    Geom,
+    GeomNode,
+    GeomTriangles,
+    GeomVertexData,
+    GeomVertexFormat,
+    GeomVertexReader,
+    GeomVertexWriter,
+    ColorAttrib,
+    LightAttrib,
+    NodePath,
+    Vec4)
+from level import lightbaker
+
+def makeFloor(size=10):
+    """Returns a node with one lit quad lying on the XY plane"""
+    vdata = GeomVertexData("floor", GeomVertexFormat.getV3n3(), Geom.UHStatic)
+    vertexWriter = GeomVertexWriter(vdata, "vertex")
+    normalWriter = GeomVertexWriter(vdata, "normal")
+    for x, y in [(0, 0), (size, 0), (size, size), (0, size)]:
+        vertexWriter.addData3f(x, y, 0)
+        normalWriter.addData3f(0, 0, 1)
+    triangles = GeomTriangles(Geom.UHStatic)
+    triangles.addVertices(0, 1, 2)
+    triangles.addVertices(0, 2, 3)
+    geom = Geom(vdata)
+    geom.addPrimitive(triangles)
+    node = GeomNode("floor")
+    node.addGeom(geom)
+    root = NodePath("root")
+    root.attachNewNode(node)
+    return root
+
+def getColors(root):
+    geom = root.find("**/+GeomNode").node().getGeom(0)
+    reader = GeomVertexReader(geom.getVertexData(), "color")
+    colors = []
+    while not reader.isAtEnd():
+        colors.append(Vec4(reader.getData4f()))
+    return colors
+
+class BakeLightingTest(unittest.TestCase):
+    def testBakesColorsIntoTheVertices(self):
+        root = makeFloor()
+        torch = root.attachNewNode("TorchTop")
+        torch.setPos(0, 0, 1)
+        lightbaker.bakeLighting(root, [torch])
+
+        colors = getColors(root)
+        self.assertEqual(len(colors), 4)
+        # the corner below the torch gets more light than the others,
+        # which only get the ambient light and a bit of the falloff
+        self.assertGreater(colors[0][0], colors[2][0])
+        self.assertGreaterEqual(colors[2][0], lightbaker.AMBIENTCOLOR[0] - 0.0001)
+        for color in colors:
+            self.assertLessEqual(max(color[0], color[1], color[2]), 1.0)
+            self.assertAlmostEqual(color[3], 1.0)
+
+    def testSwitchesToVertexColorsAndDisablesLights(self):
+        root = makeFloor()
+        lightbaker.bakeLighting(root, [])
+        node = root.find("**/+GeomNode").node()
+        colorAttrib = node.getGeomState(0).getAttrib(ColorAttrib)
+        self.assertEqual(colorAttrib.getColorType(), ColorAttrib.TVertex)
+        lightAttrib = root.getState().getAttrib(LightAttrib)
+        self.assertTrue(lightAttrib.hasAllOff())
+
+if __name__ == "__main__":
+    unittest.main()
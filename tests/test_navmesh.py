@@ -0,0 +1,54 @@
+import unittest
+from panda3d.core import Vec3
+import collisionmasks
+from level import collisionproxy
+from level import navmesh
+from tests import setUpBase
+
+def loadProxyLevel():
+    """Returns Level.egg with its collision proxies and the collision masks
+    the game uses"""
+    level = loader.loadModel("Level")
+    proxies = collisionproxy.buildCollisionProxies(level)
+    for colNP in collisionproxy.findProxySources(level):
+        colNP.removeNode()
+    proxies.reparentTo(level)
+    for colNP in proxies.getChildren():
+        name = colNP.getName().lower()
+        if name.startswith("floor") or name.startswith("plate"):
+            colNP.node().setIntoCollideMask(collisionmasks.FLOOR)
+        else:
+            colNP.node().setIntoCollideMask(collisionmasks.WALLS)
+    return level
+
+class NavMeshTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        setUpBase()
+        cls.level = loadProxyLevel()
+        cls.data = navmesh.buildNavData(cls.level)
+
+    def testLevelHasWalkableCells(self):
+        self.assertIsNotNone(self.data)
+        self.assertGreater(len(self.data["cells"]), 0)
+
+    def testPathInTheGolemRoom(self):
+        mesh = navmesh.NavMesh(self.data)
+        start = self.level.find("**/Golem*").getPos(self.level)
+        goal = start + Vec3(3, -4, 0)
+        self.assertTrue(mesh.isWalkable(mesh.getCell(goal)))
+        path = mesh.findPath(start, goal)
+        self.assertIsNotNone(path)
+        self.assertGreater(len(path), 0)
+        self.assertEqual(mesh.getCell(path[-1]), mesh.getCell(goal))
+        # the second search is served from the path cache
+        self.assertIs(mesh.findPath(start, goal), path)
+
+    def testEmptyLevelIsNotBuilt(self):
+        level = render.attachNewNode("emptyLevel")
+        level.attachNewNode("collisionProxies")
+        self.assertIsNone(navmesh.buildNavData(level))
+        level.removeNode()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+from tests import setUpBase
+
+# the speed of the moving node in units per second
+SPEED = 60.0
+
+class SimClockTest(unittest.TestCase):
+    def setUp(self):
+        setUpBase()
+        self.np = render.attachNewNode("simClockTest")
+        base.simClock.add("test_movement", self.move)
+        base.simClock.addInterpolated(self.np)
+
+    def tearDown(self):
+        base.simClock.remove("test_movement")
+        base.simClock.removeInterpolated(self.np)
+        self.np.removeNode()
+        globalClock.setFrameRate(60)
+
+    def move(self, dt):
+        self.np.setX(self.np.getX() + SPEED * dt)
+
+    def getFrameMotion(self, fps, numFrames=30, warmupFrames=10):
+        """Returns how far the rendered node moved in each frame"""
+        globalClock.setFrameRate(fps)
+        for i in range(warmupFrames):
+            taskMgr.step()
+        positions = []
+        for i in range(numFrames + 1):
+            taskMgr.step()
+            positions.append(self.np.getX())
+        return [b - a for a, b in zip(positions, positions[1:])]
+
+    def assertEvenMotion(self, fps):
+        for motion in self.getFrameMotion(fps):
+            self.assertAlmostEqual(motion, SPEED / fps, places=3)
+
+    def testEvenMotionAt30Fps(self):
+        self.assertEvenMotion(30)
+
+    def testEvenMotionAt45Fps(self):
+        self.assertEvenMotion(45)
+
+    def testEvenMotionAt144Fps(self):
+        self.assertEvenMotion(144)
+
+if __name__ == "__main__":
+    unittest.main()